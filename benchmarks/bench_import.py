@@ -0,0 +1,116 @@
+# Cold start benchmark for the zoffset_adjuster package.
+# Imports each entry point in a fresh interpreter with -X importtime and
+# reports the median time spent importing the package's own modules (and
+# everything they pull in).  The probe path is what "zoffset probe" loads
+# to read the current M851; it has to stay within PROBE_BUDGET and must not
+# load the modules only a calibration session needs.  Results can be saved
+# as a baseline and later runs compared to it.
+#
+#   python benchmarks/bench_import.py [--runs 10] [--save-baseline]
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "import_baseline.json")
+PACKAGE = "zoffset_adjuster"
+TARGETS = {
+    "package": ["zoffset_adjuster"],
+    "probe path": ["zoffset_adjuster.cli", "zoffset_adjuster.transport"],
+    "tester": ["zoffset_adjuster.cli", "zoffset_adjuster.tester"],
+    "calibrate": ["zoffset_adjuster.cli", "zoffset_adjuster.adjuster"],
+}
+PROBE_BUDGET = 0.050  # seconds
+# only a calibration session (or a full port scan) needs these
+HEAVY_MODULES = ("keyboard", "serial.tools.list_ports", "sqlite3", "mmap", "asyncio")
+REGRESSION_TOLERANCE = 0.20  # 20% slower than baseline
+NOISE_FLOOR = 0.002  # seconds, smaller differences are never flagged
+
+
+def import_once(modules):
+    # (seconds importing the package, heavy modules that got loaded) in a fresh interpreter
+    code = "import sys\n"
+    code += "".join("import " + module + "\n" for module in modules)
+    code += "print(','.join(m for m in {0!r} if m in sys.modules))".format(HEAVY_MODULES)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=REPO_DIR,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    microseconds = 0
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package", nested imports are indented
+        fields = line.split("|")
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        name = fields[2][1:]
+        if name == PACKAGE or name.startswith(PACKAGE + "."):
+            microseconds += int(fields[1])
+    loaded = [module for module in result.stdout.strip().split(",") if module]
+    return microseconds / 1e6, loaded
+
+
+def measure(runs):
+    results = {}
+    for name, modules in TARGETS.items():
+        times = []
+        loaded = []
+        for run in range(runs):
+            seconds, loaded = import_once(modules)
+            times.append(seconds)
+        results[name] = {"seconds": statistics.median(times), "heavy": loaded}
+    return results
+
+
+def compare(results, baseline):
+    # prints the table, returns the number of problems
+    problems = 0
+    print("{0:<12}{1:>12}{2:>14}  {3}".format("entry point", "import (ms)", "baseline (ms)", ""))
+    for name, result in results.items():
+        seconds = result["seconds"]
+        flag = ""
+        base = baseline.get(name)
+        base_ms = "-"
+        if base is not None:
+            base_ms = "{0:.1f}".format(base["seconds"] * 1000)
+            old = base["seconds"]
+            if seconds > old * (1 + REGRESSION_TOLERANCE) and seconds - old > NOISE_FLOOR:
+                flag += " REGRESSION(+{0:.0f}%)".format((seconds / old - 1) * 100)
+                problems += 1
+        if name == "probe path":
+            if seconds > PROBE_BUDGET:
+                flag += " OVER BUDGET({0:.0f} ms)".format(PROBE_BUDGET * 1000)
+                problems += 1
+            if result["heavy"]:
+                flag += " LOADS " + ",".join(result["heavy"])
+                problems += 1
+        print("{0:<12}{1:>12.1f}{2:>14}  {3}".format(name, seconds * 1000, base_ms, flag))
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark how long the package's entry points take to import.")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    args = parser.parse_args()
+
+    import_once(TARGETS["calibrate"])  # compiles the .pyc files, not part of a cold start
+    results = measure(args.runs)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r") as baseline_file:
+            baseline = json.load(baseline_file)["entry points"]
+    problems = compare(results, baseline)
+    if args.save_baseline:
+        with open(args.baseline, "w") as baseline_file:
+            json.dump({"python": sys.version.split()[0], "entry points": results}, baseline_file, indent=4)
+        print("baseline saved to " + args.baseline)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,175 @@
+# End-to-end latency benchmark for a calibration session.
+# Starts the simulated Marlin printer in its own process (so its work does
+# not count against ours), runs a full ZOffsetAdjuster session against it
+# with a scripted key sequence and reports wall and CPU time per phase:
+# discovery, firmware query, preheat, setup, paper test, single test
+# moves and finish.  Key presses in the paper test come faster than the
+# nozzle moves and are coalesced, so "test iteration" is timed with direct
+# test moves once the offset has been accepted.  Results can be saved as a baseline and later runs compared to it.
+#
+#   python benchmarks/bench_session.py [--runs 3] [--speed 50] [--save-baseline]
+#   python benchmarks/bench_session.py --keys "space,-,-,+,r,enter"
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, REPO_DIR)
+
+from zoffset_adjuster.adjuster import ZOffsetAdjuster
+from zoffset_adjuster.key_input import ScriptedKeys
+from zoffset_adjuster.port_discovery import scan_ports
+from zoffset_adjuster.session_pipeline import SessionPipeline
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "session_baseline.json")
+DEFAULT_KEYS = "space,-,-,+,r,enter"
+PHASES = ("discovery", "firmware query", "preheat", "setup", "test iteration", "paper test", "finish")
+REGRESSION_TOLERANCE = 0.20  # 20% slower than baseline
+NOISE_FLOOR = 0.005  # seconds, smaller differences are never flagged
+ITERATION_MOVES = (-0.1, -0.2, -0.1, 0.0)  # test offsets around the accepted one: down, down, up, back up
+
+
+def start_simulator(firmware, speed):
+    # returns the simulator process and the pty path it printed
+    process = subprocess.Popen(
+        [sys.executable, "-m", "zoffset_adjuster.marlin_simulator",
+         "--firmware", firmware, "--speed", str(speed)],
+        cwd=REPO_DIR, stdout=subprocess.PIPE, universal_newlines=True)
+    line = process.stdout.readline()
+    return process, line.split(" on ")[-1].strip()
+
+
+class PhaseTimer:
+    def __init__(self):
+        self.wall = {}
+        self.cpu = {}
+
+    def add(self, name, wall, cpu):
+        self.wall[name] = self.wall.get(name, 0.0) + wall
+        if cpu is not None:
+            self.cpu[name] = self.cpu.get(name, 0.0) + cpu
+
+    def wrap(self, name, fn):
+        def timed(*args):
+            wall, cpu = time.perf_counter(), time.process_time()
+            result = fn(*args)
+            self.add(name, time.perf_counter() - wall, time.process_time() - cpu)
+            return result
+        return timed
+
+
+def run_session(device, keys):
+    timer = PhaseTimer()
+    adjuster = ZOffsetAdjuster()
+    with open(os.path.join(REPO_DIR, "config.json"), "r") as cfg:
+        adjuster.apply_config(json.load(cfg))
+    adjuster.KEYS = ScriptedKeys(keys)
+    with contextlib.redirect_stdout(io.StringIO()):
+        port, device, adjuster.SERIAL_SPEED = timer.wrap("discovery", scan_ports)([device], adjuster.BAUD_RATES)
+        if port is None:
+            raise OSError("simulator did not answer on " + device)
+        port.timeout = adjuster.SERIAL_TIMEOUT
+        adjuster.PRINTER = port
+        adjuster.start_reader()
+        timer.wrap("firmware query", adjuster.get_firmware_version)()
+        pipeline = SessionPipeline(timer.wrap("preheat", adjuster.start_preheat),
+                                   timer.wrap("preheat", adjuster.wait_for_preheat))
+        pipeline.add_stage("read current Z-offset", timer.wrap("setup", adjuster.save_current_z_offset))
+        pipeline.add_stage("setup", timer.wrap("setup", adjuster.setup_z_offset_measurement))
+        pipeline.add_stage("paper test", timer.wrap("paper test", adjuster.paper_test), needs_heat=True)
+        pipeline.run()
+        if not adjuster.ABORTED:
+            time_test_moves(adjuster, timer)
+        timer.wrap("finish", adjuster.finish_session)()
+        adjuster.close_printer()
+    return timer
+
+
+def time_test_moves(adjuster, timer):
+    # mean of single test moves, each waited for, ending back at the accepted offset
+    walls = []
+    cpus = []
+    for delta in ITERATION_MOVES:
+        wall, cpu = time.perf_counter(), time.process_time()
+        adjuster.test_move(round(adjuster.Z_OFFSET + delta, 2))
+        walls.append(time.perf_counter() - wall)
+        cpus.append(time.process_time() - cpu)
+    timer.add("test iteration", statistics.mean(walls), statistics.mean(cpus))
+
+
+def summarise(timers):
+    # median over all runs for every phase
+    phases = {}
+    for name in PHASES:
+        walls = [timer.wall[name] for timer in timers if name in timer.wall]
+        cpus = [timer.cpu[name] for timer in timers if name in timer.cpu]
+        if walls:
+            phases[name] = {"wall": statistics.median(walls),
+                            "cpu": statistics.median(cpus) if cpus else None}
+    return phases
+
+
+def compare(phases, baseline):
+    # prints the table, returns the number of regressions
+    regressions = 0
+    print("{0:<16}{1:>12}{2:>12}{3:>14}  {4}".format("phase", "wall (s)", "cpu (s)", "baseline wall", ""))
+    for name, result in phases.items():
+        base = baseline.get(name)
+        cpu = "-" if result["cpu"] is None else "{0:.4f}".format(result["cpu"])
+        flag = ""
+        base_wall = "-"
+        if base is not None:
+            base_wall = "{0:.4f}".format(base["wall"])
+            for metric in ("wall", "cpu"):
+                old, new = base.get(metric), result[metric]
+                if old is None or new is None:
+                    continue
+                if new > old * (1 + REGRESSION_TOLERANCE) and new - old > NOISE_FLOOR:
+                    flag += " REGRESSION(" + metric + " +{0:.0f}%)".format((new / old - 1) * 100)
+                    regressions += 1
+        print("{0:<16}{1:>12.4f}{2:>12}{3:>14}  {4}".format(name, result["wall"], cpu, base_wall, flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark a full calibration session against the simulator.")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--speed", type=float, default=50, help="simulator time acceleration")
+    parser.add_argument("--firmware", default="2.0.7.2", choices=("1.1.9", "2.0.7.2"))
+    parser.add_argument("--keys", default=DEFAULT_KEYS, help="comma separated key names for the paper test")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    args = parser.parse_args()
+
+    timers = []
+    for run in range(args.runs):
+        process, device = start_simulator(args.firmware, args.speed)
+        try:
+            timers.append(run_session(device, args.keys.split(",")))
+        finally:
+            process.terminate()
+            process.wait()
+    phases = summarise(timers)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r") as baseline_file:
+            baseline = json.load(baseline_file)["phases"]
+    regressions = compare(phases, baseline)
+    if args.save_baseline:
+        with open(args.baseline, "w") as baseline_file:
+            json.dump({"speed": args.speed, "firmware": args.firmware, "keys": args.keys,
+                       "phases": phases}, baseline_file, indent=4)
+        print("baseline saved to " + args.baseline)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,46 @@
+# Micro-benchmark for the temperature report parser.
+# Replays the recorded report lines in temp_reports.txt through
+# parse_temp_report and shows how many reports per second it can handle
+# compared to the rate the printer sends them at (M155 S<n>).
+#
+#   python benchmarks/bench_temp_report.py [--repeat N]
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from zoffset_adjuster.temp_report import parse_temp_report
+
+REPORTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "temp_reports.txt")
+
+
+def load_reports():
+    with open(REPORTS_FILE, "r") as reports:
+        return [line.rstrip("\n") for line in reports if line.strip()]
+
+
+def run(repeat):
+    lines = load_reports()
+    for line in lines:
+        if parse_temp_report(line) is None:
+            print("unparsed report: " + line)
+
+    def parse_all():
+        for line in lines:
+            parse_temp_report(line)
+
+    best = min(timeit.repeat(parse_all, number=repeat, repeat=5))
+    per_line = best / (repeat * len(lines))
+    print("{0} recorded reports x {1}".format(len(lines), repeat))
+    print("  {0:.2f} us per report, {1:,.0f} reports/s".format(per_line * 1e6, 1 / per_line))
+    # M155 S1 is one report per second per printer
+    print("  headroom at M155 S1: {0:,.0f} printers per core".format(1 / per_line))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the temperature report parser.")
+    parser.add_argument("--repeat", type=int, default=200, help="passes over the recorded reports")
+    run(parser.parse_args().repeat)
@@ -0,0 +1,35 @@
+import math
+
+from zoffset_adjuster.bed_survey import distance, grid_points, tour_length, visiting_order
+
+
+def test_visits_every_point_once():
+    points = grid_points(220, 220, 30, 3, 3)
+    order = visiting_order(points, (110, 110))
+    assert sorted(order) == list(range(len(points)))
+
+
+def test_points_on_a_line_are_visited_in_line():
+    points = [(50, 0), (10, 0), (40, 0), (20, 0), (30, 0)]
+    assert [points[index] for index in visiting_order(points, (0, 0))] == sorted(points)
+
+
+def test_grid_tour_from_a_corner_is_a_serpentine():
+    points = grid_points(220, 220, 30, 3, 3)
+    order = visiting_order(points, (0, 0))
+    assert math.isclose(tour_length((0, 0), points, order), math.hypot(30, 30) + 8 * 80)
+
+
+def test_no_single_reversal_shortens_the_tour():
+    points = [(30, 30), (190, 190), (190, 30), (30, 190), (110, 110), (70, 150), (150, 60)]
+    start = (0, 0)
+    order = visiting_order(points, start)
+    length = tour_length(start, points, order)
+    for i in range(len(order)):
+        for j in range(i + 1, len(order)):
+            reversed_order = order[:i] + order[i:j + 1][::-1] + order[j + 1:]
+            assert tour_length(start, points, reversed_order) >= length - 1e-9
+
+
+def test_distance():
+    assert distance((0, 0), (3, 4)) == 5
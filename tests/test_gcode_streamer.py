@@ -0,0 +1,75 @@
+import pytest
+
+from zoffset_adjuster import gcode_streamer
+from zoffset_adjuster.gcode_streamer import StreamingQueue, checksum, number_line
+from zoffset_adjuster.serial_reader import SerialReader
+
+
+class FakePort:
+    # records the lines written, the test plays the firmware through reader.dispatch()
+    def __init__(self):
+        self.lines = []
+
+    def write(self, data):
+        self.lines.append(data.decode("Ascii").strip())
+        return len(data)
+
+
+@pytest.fixture
+def streamer(monkeypatch):
+    monkeypatch.setattr(gcode_streamer, "RESEND_SETTLE", 60)  # the test resumes by hand
+    port = FakePort()
+    reader = SerialReader(port)
+    queue = StreamingQueue(port, reader, depth=4, rx_buffer=128)
+    yield port, reader, queue
+    if queue.resume_timer is not None:
+        queue.resume_timer.cancel()
+
+
+def numbered(first, last):
+    return [number_line(number, "G1 X{0}".format(number)) for number in range(first, last + 1)]
+
+
+def test_number_line():
+    assert number_line(1, "G28") == "N1 G28*{0}".format(checksum("N1 G28"))
+    assert checksum("N1 G28") == ord("N") ^ ord("1") ^ ord(" ") ^ ord("G") ^ ord("2") ^ ord("8")
+
+
+def test_resend_drops_the_rejected_lines_and_sends_them_again(streamer):
+    port, reader, queue = streamer
+    futures = [queue.send("G1 X{0}".format(number)) for number in range(1, 5)]
+    assert port.lines == numbered(1, 4)
+    reader.dispatch("ok")
+    reader.dispatch("Error:checksum mismatch, Last Line: 2")
+    reader.dispatch("Resend: 3")
+    reader.dispatch("ok")  # goes with the resend request, not with line 2
+    assert futures[0].done() and not futures[1].done()
+    assert [command.number for command in queue.in_flight] == [2]
+    assert [command.number for command in queue.pending] == [3, 4]
+    assert len(port.lines) == 4  # held while the firmware may still reject lines
+
+    queue.resume()
+    assert port.lines[4:] == numbered(3, 4)
+    for line in range(3):
+        reader.dispatch("ok")
+    assert all(future.done() for future in futures)
+    assert not queue.in_flight and queue.resends == 1 and queue.underruns == 1
+
+
+def test_lines_still_on_the_wire_are_rejected_without_another_resend(streamer):
+    port, reader, queue = streamer
+    futures = [queue.send("G1 X{0}".format(number)) for number in range(1, 5)]
+    reader.dispatch("Resend: 2")
+    reader.dispatch("ok")
+    reader.dispatch("Resend: 2")  # line 4 arrived after the buffer was cleared
+    reader.dispatch("ok")
+    assert queue.resends == 1
+    assert [command.number for command in queue.in_flight] == [1]
+    assert [command.number for command in queue.pending] == [2, 3, 4]
+
+    queue.resume()
+    assert port.lines[4:] == numbered(2, 4)
+    for line in range(4):
+        reader.dispatch("ok")
+    assert all(future.done() for future in futures)
+    assert not queue.in_flight and not queue.pending
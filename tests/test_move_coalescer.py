@@ -0,0 +1,94 @@
+import concurrent.futures
+import threading
+import types
+
+import pytest
+
+from zoffset_adjuster.move_coalescer import MoveCoalescer
+
+
+class FakeCommands:
+    # moves are withdrawn while the printer has not got them yet
+    def __init__(self):
+        self.with_printer = False
+        self.reader = types.SimpleNamespace(running=True)
+
+    def cancel(self, futures):
+        if self.with_printer:
+            return False
+        for future in futures:
+            future.cancel()
+        return True
+
+
+@pytest.fixture
+def mover():
+    commands = FakeCommands()
+    moves = []  # (offset, from_offset, future) for every move started
+    arrivals = []
+
+    def start_move(offset, from_offset):
+        future = concurrent.futures.Future()
+        moves.append((offset, from_offset, future))
+        return [future]
+
+    coalescer = MoveCoalescer(commands, start_move, lambda offset, seconds: arrivals.append(offset))
+    return coalescer, commands, moves, arrivals
+
+
+def finish(moves):
+    moves[-1][2].set_result([])
+
+
+def test_presses_during_a_move_become_one_move(mover):
+    coalescer, commands, moves, arrivals = mover
+    coalescer.request(-2.5)
+    commands.with_printer = True
+    coalescer.request(-2.6)
+    coalescer.request(-2.7)
+    assert [move[:2] for move in moves] == [(-2.5, None)]
+    finish(moves)
+    assert [move[:2] for move in moves] == [(-2.5, None), (-2.7, -2.5)]
+    assert arrivals == []  # superseded while moving
+    finish(moves)
+    assert coalescer.wait() == -2.7
+    assert arrivals == [-2.7]
+
+
+def test_a_move_the_printer_has_not_got_is_replaced(mover):
+    coalescer, commands, moves, arrivals = mover
+    coalescer.request(-2.5)
+    coalescer.request(-2.6)
+    assert [move[:2] for move in moves] == [(-2.5, None), (-2.6, None)]
+    assert moves[0][2].cancelled()
+    finish(moves)
+    assert coalescer.wait() == -2.6
+    assert arrivals == [-2.6]
+
+
+def test_repeat_moves_again_to_the_same_offset(mover):
+    coalescer, commands, moves, arrivals = mover
+    coalescer.request(-2.5)
+    finish(moves)
+    coalescer.request(-2.5, repeat=True)
+    finish(moves)
+    assert [move[:2] for move in moves] == [(-2.5, None), (-2.5, -2.5)]
+    assert arrivals == [-2.5, -2.5]
+
+
+def test_wait_returns_after_the_arrival_callback(mover):
+    coalescer, commands, moves, arrivals = mover
+    coalescer.request(-2.5)
+    timer = threading.Timer(0.05, finish, (moves,))
+    timer.start()
+    assert coalescer.wait() == -2.5
+    assert arrivals == [-2.5]  # the prompt is printed before the caller carries on
+    timer.join()
+
+
+def test_wait_fails_when_the_reader_stops(mover):
+    coalescer, commands, moves, arrivals = mover
+    coalescer.request(-2.5)
+    commands.reader.running = False
+    with pytest.raises(EOFError):
+        coalescer.wait()
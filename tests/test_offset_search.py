@@ -0,0 +1,44 @@
+import pytest
+
+from zoffset_adjuster.offset_search import BisectionSearch
+
+
+def search(answer, low=-2.75, high=-2.25):
+    # runs the search against an operator whose paper is right at answer, returns it when done
+    bisection = BisectionSearch(low, high)
+    while not bisection.done():
+        offset = bisection.next_offset()
+        if offset < answer:
+            bisection.too_tight()
+        else:
+            bisection.too_loose()
+        assert bisection.moves < 50
+    return bisection
+
+
+@pytest.mark.parametrize("answer", [-2.75, -2.74, -2.62, -2.50, -2.26, -2.25])
+def test_finds_offsets_inside_the_bracket(answer):
+    assert search(answer).result() == answer
+
+
+@pytest.mark.parametrize("answer", [-3.50, -2.76, -2.24, -1.00])
+def test_widens_past_an_unconfirmed_end(answer):
+    assert search(answer).result() == answer
+
+
+def test_tests_an_unconfirmed_end_before_widening():
+    # every answer runs into the low end, one move there confirms it
+    assert search(-2.74).moves == 6
+    assert search(-3.50).moves == 14
+
+
+def test_not_done_until_both_ends_are_confirmed():
+    bisection = BisectionSearch(-2.75, -2.25)
+    while bisection.high - bisection.low > 1:
+        bisection.next_offset()
+        bisection.too_loose()
+    assert not bisection.done()
+    assert bisection.next_offset() == -2.75  # the guessed low end itself
+    bisection.too_tight()
+    assert bisection.done()
+    assert bisection.result() == -2.74
@@ -0,0 +1,52 @@
+from zoffset_adjuster.printer_settings import PrinterSettings, ENDSTOPS, PROBE_Z_OFFSET, BED_TARGET
+
+
+def session(offset=-2.5):
+    # settings as read from a printer at the start of a session
+    settings = PrinterSettings()
+    settings.learn(PROBE_Z_OFFSET, offset)
+    settings.snapshot()
+    return settings
+
+
+def test_change_skips_values_the_printer_already_has():
+    settings = session()
+    assert settings.change(PROBE_Z_OFFSET, -2.5) is None
+    assert settings.change(PROBE_Z_OFFSET, -2.501) is None  # same command text
+    assert settings.change(PROBE_Z_OFFSET, -0.0) == "M851 Z0.00"
+    assert settings.change(BED_TARGET, 60.0) == "M140 S60"
+    assert settings.skipped == 2
+
+
+def test_commit_saves_only_persistent_changes():
+    settings = session()
+    assert settings.change(ENDSTOPS, 0) == "M211 S0"
+    assert settings.commit() is None  # soft endstops are not kept in EEPROM
+    settings.change(PROBE_Z_OFFSET, -2.62)
+    assert settings.commit() == "M500"
+    assert settings.commit() is None
+    assert settings.rollback() == []
+
+
+def test_commit_skips_a_change_that_was_changed_back():
+    settings = session()
+    settings.change(PROBE_Z_OFFSET, 0.0)
+    settings.change(PROBE_Z_OFFSET, -2.5)
+    assert settings.commit() is None
+
+
+def test_rollback_restores_the_snapshot():
+    settings = session()
+    settings.change(PROBE_Z_OFFSET, 0.0)
+    settings.change(PROBE_Z_OFFSET, -2.62)
+    assert settings.rollback() == ["M851 Z-2.50"]
+    assert settings.unsaved() == []
+    assert settings.change(PROBE_Z_OFFSET, -2.5) is None
+
+
+def test_rollback_reloads_the_eeprom_when_the_offset_was_never_read():
+    settings = PrinterSettings()
+    settings.snapshot()
+    settings.change(PROBE_Z_OFFSET, 0.0)
+    assert settings.rollback() == ["M501"]
+    assert settings.change(PROBE_Z_OFFSET, 0.0) == "M851 Z0.00"  # value unknown again
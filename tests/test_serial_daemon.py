@@ -0,0 +1,80 @@
+import queue
+import socket
+import threading
+
+import pytest
+
+pytest.importorskip("serial")
+
+from zoffset_adjuster.serial_daemon import DaemonPort, PrinterLink, receive_message, send_message
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="needs Unix sockets")
+
+
+class FakeSerial:
+    # answers the resync marker in two reads, as a serial port whose read timed out mid-line
+    def __init__(self):
+        self.lines = queue.Queue()
+        self.written = []
+        self.timeout = None
+
+    def write(self, data):
+        self.written.append(data)
+        marker = data.split(b"M118 ")[-1].strip()
+        if b"M118" in data:
+            for chunk in (b"ok\n", b"echo:Unknown command: \"M118 " + marker[:8], marker[8:] + b"\"\n", b"ok\n"):
+                self.lines.put(chunk)  # a stale "ok" for the previous client comes first
+        return len(data)
+
+    def readline(self):
+        try:
+            return self.lines.get(timeout=0.05)
+        except queue.Empty:
+            return b""
+
+    def close(self):
+        pass
+
+
+def test_attach_resyncs_across_a_split_marker():
+    link = PrinterLink("fake", 115200, FakeSerial())
+    client, server = socket.socketpair()
+    try:
+        assert link.attach(server) is None
+        assert receive_message(client) == {"ok": True, "port": "fake", "baud": 115200}
+        link.port.lines.put(b"ok T:20.0 /0.0\n")
+        client.settimeout(1)
+        assert client.recv(100) == b"ok T:20.0 /0.0\n"  # the stale "ok"s were not forwarded
+    finally:
+        link.close()
+        client.close()
+        server.close()
+
+
+def test_daemon_port_socket_stays_blocking(tmp_path):
+    path = str(tmp_path / "daemon.sock")
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen()
+
+    def daemon():
+        conn, address = listener.accept()
+        receive_message(conn)
+        send_message(conn, {"ok": True, "port": "fake", "baud": 115200})
+        conn.sendall(b"ok\n")
+        conn.recv(100)  # until the client closes
+        conn.close()
+
+    thread = threading.Thread(target=daemon)
+    thread.start()
+    port = DaemonPort(path=path, timeout=0.05)
+    try:
+        assert port.readline() == b"ok\n"
+        assert port.readline() == b""  # timed out
+        assert port.in_waiting == 0
+        assert port.sock.gettimeout() is None  # a write on another thread is never cut short
+        assert port.write(b"M105\n") == 5
+    finally:
+        port.close()
+        thread.join()
+        listener.close()
@@ -0,0 +1,49 @@
+import pytest
+
+from zoffset_adjuster.serial_reader import SerialReader, classify_response, BUSY, OK, OTHER, TEMPERATURE
+from zoffset_adjuster.telemetry import Telemetry
+from zoffset_adjuster.temp_report import HeaterReading, HOTEND
+
+
+@pytest.mark.parametrize("line", [
+    "T:18.12 /0.00 B:34.11 /0.00 @:0 B@:0",
+    "T0:200.0 /200.0 T1:180.0 /190.0 B:60 /60 @0:10 @1:127",
+    "B:60.0 /60.0 T0:200.0 /200.0",
+    "C:25.1 /0.0",
+])
+def test_temperature_reports(line):
+    assert classify_response(line) == TEMPERATURE
+
+
+@pytest.mark.parametrize("line, kind", [
+    ("ok T:210.3 /210.0 B:60.1 /60.0", OK),  # an M105 reply belongs to its command
+    ("TMC connection error", OTHER),
+    ("Temperature report", OTHER),
+])
+def test_not_temperature_reports(line, kind):
+    assert classify_response(line) == kind
+
+
+def test_multi_tool_report_reaches_telemetry():
+    reader = SerialReader(None)
+    telemetry = Telemetry(reader, capacity=4)
+    telemetry.start()
+    reports = []
+    telemetry.add_listener(reports.append)
+    reader.dispatch("T0:200.0 /200.0 T1:180.0 /190.0 B:60 /60 @0:10 @1:127")
+    assert len(reports) == 1
+    assert reports[0].hotend == HeaterReading(200.0, 200.0, 10.0)
+    assert [sample[1] for sample in telemetry.rings[HOTEND].samples()] == [200.0]
+    assert [sample[1] for sample in telemetry.rings["T1"].samples()] == [180.0]
+
+
+def test_lines_without_a_handler_are_dropped():
+    reader = SerialReader(None)
+    busy = []
+    reader.route(BUSY, busy.append)
+    reader.dispatch("echo:busy: processing")
+    reader.route(BUSY, None)
+    for line in ("echo:busy: processing", "ok", "start"):
+        reader.dispatch(line)
+    assert busy == ["echo:busy: processing"]
+    assert reader.dropped == 3
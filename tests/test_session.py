@@ -0,0 +1,48 @@
+# Full calibration sessions against the simulated printer, checking the
+# G-code the adjuster sends for setup, accept and abort.
+
+import os
+
+import pytest
+
+pytest.importorskip("pty")  # the simulator needs a pseudo terminal
+
+from zoffset_adjuster.adjuster import ZOffsetAdjuster, calibrate
+from zoffset_adjuster.batch_script import load_batch_script
+from zoffset_adjuster.marlin_simulator import MarlinSimulator
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# M105/M155 temperature polling and the M115 handshake are left out
+SETUP = ["M140 S50", "M104 S200", "M851", "M211 S1", "M851 Z0.00", "G28", "G1 X110 Y110 F6000", "M400",
+         "M211 S0", "G0 Z-2.50 F4800", "M400", "G0 Z-2.60 F4800", "M400", "M211 S1"]
+
+
+@pytest.fixture
+def printer(monkeypatch):
+    monkeypatch.chdir(REPO_DIR)  # config.json
+    monkeypatch.setattr(ZOffsetAdjuster, "STORE_FILE", "")
+    monkeypatch.setattr(ZOffsetAdjuster, "DAEMON_SOCKET", "")
+    simulator = MarlinSimulator(speed=200, z_offset=-2.5)
+    simulator.start()
+    yield simulator
+    simulator.stop()
+
+
+def gcode(simulator):
+    return [command for command in simulator.received if not command.startswith(("M105", "M115", "M155"))]
+
+
+def test_accept_saves_the_new_offset(printer):
+    status = calibrate(printer.port_name, load_batch_script("bed=50 extruder=200 - accept"))
+    assert status == 0
+    assert gcode(printer) == SETUP + ["G92 Z0", "M851 Z-2.60", "M500", "M140 S0", "M104 S0", "G0 Z10"]
+    assert printer.eeprom_z_offset == -2.6
+
+
+def test_abort_rolls_the_offset_back(printer):
+    status = calibrate(printer.port_name, load_batch_script("bed=50 extruder=200 - abort"))
+    assert status == 1
+    assert gcode(printer) == SETUP + ["M140 S0", "M104 S0", "M851 Z-2.50"]
+    assert "M500" not in printer.received
+    assert printer.z_offset == -2.5 and printer.eeprom_z_offset == -2.5
@@ -0,0 +1,64 @@
+from zoffset_adjuster.session_log import MAGIC, FROM_PRINTER, TO_PRINTER, RecordingPort, ReplayPort, read_records
+
+
+class ScriptedPrinter:
+    # answers each command written with its lines from replies
+    def __init__(self, replies):
+        self.replies = replies
+        self.lines = []
+
+    def write(self, data):
+        self.lines.extend(self.replies[data])
+        return len(data)
+
+    def readline(self):
+        return self.lines.pop(0) if self.lines else b""
+
+    def close(self):
+        pass
+
+
+REPLIES = {
+    b"M115\n": [b"FIRMWARE_NAME:Marlin 2.0.7.2\n", b"ok\n"],
+    b"M851\n": [b"echo:Probe Offset X-44.00 Y-10.00 Z-2.50\n", b"ok\n"],
+}
+
+
+def record(path, commands):
+    port = RecordingPort(ScriptedPrinter(REPLIES), str(path))
+    for command in commands:
+        port.write(command)
+        while port.readline():
+            pass
+    port.close()
+
+
+def test_recording_holds_both_directions_in_order(tmp_path):
+    path = tmp_path / "session.zlog"
+    record(path, [b"M115\n", b"M851\n"])
+    data = path.read_bytes()
+    assert data.startswith(MAGIC)
+    records = [(direction, bytes(payload)) for direction, timestamp, payload in read_records(data)]
+    assert records == [(TO_PRINTER, b"M115\n")] + [(FROM_PRINTER, line) for line in REPLIES[b"M115\n"]] + \
+        [(TO_PRINTER, b"M851\n")] + [(FROM_PRINTER, line) for line in REPLIES[b"M851\n"]]
+
+
+def test_replay_answers_the_recorded_commands(tmp_path):
+    path = tmp_path / "session.zlog"
+    record(path, [b"M115\n", b"M851\n"])
+    replay = ReplayPort(str(path), speed=0, timeout=0.1)
+    replay.write(b"M851\n")  # M115 is skipped together with its responses
+    assert [replay.readline(), replay.readline(), replay.readline()] == REPLIES[b"M851\n"] + [b""]
+    replay.write(b"M115\n")  # already played past, the printer stays silent
+    assert replay.readline() == b""
+    replay.close()
+
+
+def test_a_second_recording_appends_to_the_log(tmp_path):
+    path = tmp_path / "session.zlog"
+    record(path, [b"M115\n"])
+    record(path, [b"M851\n"])
+    data = path.read_bytes()
+    assert data.count(MAGIC) == 1
+    assert [bytes(payload) for direction, timestamp, payload in read_records(data)
+            if direction == TO_PRINTER] == [b"M115\n", b"M851\n"]
@@ -0,0 +1,42 @@
+import math
+
+from zoffset_adjuster.serial_reader import SerialReader
+from zoffset_adjuster.telemetry import SampleRing, Telemetry
+
+
+def test_ring_keeps_the_latest_samples_oldest_first():
+    ring = SampleRing(3)
+    for second in range(5):
+        ring.append(float(second), 20.0 + second, 60.0, 127.0)
+    assert len(ring) == 3
+    assert [sample[0] for sample in ring.samples()] == [2.0, 3.0, 4.0]
+    assert [sample[1] for sample in ring.samples()] == [22.0, 23.0, 24.0]
+
+
+def test_ring_before_it_is_full():
+    ring = SampleRing(4)
+    ring.append(0.0, 20.0, None, None)
+    ring.append(1.0, 21.0, 60.0, 127.0)
+    samples = list(ring.samples())
+    assert len(ring) == 2
+    assert samples[1] == (1.0, 21.0, 60.0, 127.0)
+    assert math.isnan(samples[0][2]) and math.isnan(samples[0][3])  # missing target and power
+
+
+def test_ring_wraps_around_many_times():
+    ring = SampleRing(7)
+    for second in range(100):
+        ring.append(float(second), 0.0, None, None)
+    assert [sample[0] for sample in ring.samples()] == [float(second) for second in range(93, 100)]
+
+
+def test_export_writes_every_buffered_sample(tmp_path):
+    telemetry = Telemetry(SerialReader(None), capacity=2)
+    for line in ("T:20.0 /200.0 B:20.0 /0.0 @:127 B@:0", "T:25.0 /200.0 B:21.0 /0.0 @:127 B@:0",
+                 "T:30.0 /200.0 B:22.0 /0.0 @:127 B@:0"):
+        telemetry.feed(line)
+    path = tmp_path / "telemetry.csv"
+    assert telemetry.export(str(path)) == 4
+    rows = path.read_text().splitlines()
+    assert rows[0] == "heater,seconds,temperature,target,power"
+    assert [row.split(",")[2] for row in rows[1:]] == ["21.00", "22.00", "25.00", "30.00"]
@@ -0,0 +1,35 @@
+from zoffset_adjuster.temp_report import parse_temp_report, select_heater, HeaterReading, BED, HOTEND
+
+
+def test_single_hotend_and_bed():
+    report = parse_temp_report("T:18.12 /0.00 B:34.11 /60.00 @:0 B@:127")
+    assert report.hotend == HeaterReading(18.12, 0.0, 0.0)
+    assert report.bed == HeaterReading(34.11, 60.0, 127.0)
+    assert report.chamber is None
+    assert report.tools == ()
+
+
+def test_ok_prefixed_m105_reply():
+    report = parse_temp_report("ok T:210.3 /210.0 B:60.1 /60.0 @:64 B@:127")
+    assert select_heater(report, HOTEND) == HeaterReading(210.3, 210.0, 64.0)
+    assert select_heater(report, BED) == HeaterReading(60.1, 60.0, 127.0)
+
+
+def test_multi_tool_report():
+    report = parse_temp_report("T0:200.0 /200.0 T1:180.0 /190.0 B:60 /60 @0:10 @1:127")
+    assert report.hotend == HeaterReading(200.0, 200.0, 10.0)  # tool 0 when there is no plain T
+    assert select_heater(report, "T1") == HeaterReading(180.0, 190.0, 127.0)
+    assert select_heater(report, "T2") is None
+    assert report.bed.power is None
+
+
+def test_raw_adc_values_and_other_sensors():
+    report = parse_temp_report("T:20.0 /0.0 (4056) B:21.0 /0.0 (4000) C:25.1 /0.0 P:22.0")
+    assert report.hotend == HeaterReading(20.0, 0.0, None)
+    assert report.chamber == HeaterReading(25.1, 0.0, None)
+    assert report.probe == HeaterReading(22.0, None, None)
+
+
+def test_lines_without_temperatures():
+    assert parse_temp_report("ok") is None
+    assert parse_temp_report("echo:busy: processing") is None
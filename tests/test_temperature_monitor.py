@@ -0,0 +1,47 @@
+from zoffset_adjuster.temperature_monitor import Heater
+
+
+def feed(heater, temperatures, power=0, start=0):
+    # one report per second
+    for second, temperature in enumerate(temperatures, start):
+        heater.update(temperature, power, float(second))
+    return start + len(temperatures)
+
+
+def test_ready_once_the_window_is_stable():
+    heater = Heater("Bed", "B", 60, 1, tolerance=1.0, window=8)
+    elapsed = feed(heater, [40, 45, 50, 55, 58.5], power=127)
+    assert heater.ready_after is None
+    feed(heater, [60.2, 60.1, 59.9, 60.0, 60.1, 60.0, 59.8], start=elapsed)
+    assert heater.ready_after is None  # 58.5 is still in the window
+    feed(heater, [60.0], start=elapsed + 7)
+    assert heater.ready_after == elapsed + 7
+
+
+def test_one_sample_at_the_target_is_not_enough():
+    heater = Heater("Extruder", "T", 200, 127, tolerance=1.0, window=8)
+    feed(heater, [150, 180, 198, 203, 206, 204, 202, 201])
+    assert heater.ready_after is None  # overshooting
+
+
+def test_bang_bang_swing_falls_back_to_target_and_power():
+    heater = Heater("Bed", "B", 60, 1, tolerance=1.0, window=8, settle_limit=10)
+    elapsed = feed(heater, [50, 55, 58.5])
+    # wider than the tolerance, never stable
+    elapsed = feed(heater, [59.5, 60.5, 61.5, 60.5, 59.5, 59.2, 60.5, 61.5, 60.5, 59.5], power=127, start=elapsed)
+    assert heater.settling == 10 and heater.ready_after is None  # at the limit but still heating
+    elapsed = feed(heater, [61.5], power=0, start=elapsed)
+    assert heater.ready_after == elapsed - 1
+
+
+def test_fallback_needs_the_target_reached():
+    heater = Heater("Bed", "B", 60, 1, tolerance=1.0, window=8, settle_limit=3)
+    feed(heater, [59.2, 61.5, 59.2, 61.5, 59.2], power=0)
+    assert heater.ready_after == 3  # the first report at the target after the limit
+
+
+def test_eta_from_the_heating_rate():
+    heater = Heater("Extruder", "T", 200, 127, tolerance=1.0, window=8)
+    feed(heater, [99, 101, 103, 105], power=127)
+    assert heater.eta() == (199 - 105) / 2.0
+    assert heater.status() == "Extruder: 105.0 -> 200 (47s)"
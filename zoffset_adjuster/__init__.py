@@ -0,0 +1,18 @@
+# Z probe offset calibration for Marlin printers.
+# Nothing is imported up front, so tooling that needs one module (or the
+# "zoffset probe" query) does not load the whole session; ZOffsetAdjuster
+# and calibrate are imported on first use.
+
+LAZY_NAMES = {
+    "ZOffsetAdjuster": "adjuster",
+    "calibrate": "adjuster",
+    "PrinterTransport": "transport",
+    "SerialTester": "tester",
+}
+
+
+def __getattr__(name):
+    if name not in LAZY_NAMES:
+        raise AttributeError("module " + repr(__name__) + " has no attribute " + repr(name))
+    import importlib
+    return getattr(importlib.import_module("." + LAZY_NAMES[name], __name__), name)
@@ -0,0 +1,7 @@
+# python -m zoffset_adjuster <command>, same as the zoffset entry point
+
+import sys
+
+from .cli import main
+
+sys.exit(main())
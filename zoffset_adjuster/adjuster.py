@@ -0,0 +1,647 @@
+# Python script to facilitate setting Z probe offset
+# Example temp report from printer: "T:18.12 /0.00 B:34.11 /0.00 @:0 B@:0"
+
+import json
+import os
+import re
+import time
+from .bed_survey import OffsetSurvey, grid_points, parse_grid, tour_length, visiting_order
+from .calibration_store import CalibrationStore, PrinterIdentity, STORE_FILE
+from .command_trace import CommandTracer
+from .key_input import ConsoleKeys, KEY_DOWN
+from .move_coalescer import MoveCoalescer
+from .offset_search import BisectionSearch
+from .printer_settings import PrinterSettings, ENDSTOPS, PROBE_Z_OFFSET, BED_TARGET, HOTEND_TARGET
+from .serial_reader import BUSY
+from .session_log import RecordingPort
+from .session_pipeline import SessionPipeline
+from .telemetry import Telemetry, CAPACITY, EXPORT_FILE, REPORT_INTERVAL
+from .temperature_monitor import TemperatureMonitor, BED, EXTRUDER, SETTLE_LIMIT, TOLERANCE, WINDOW
+from .transport import PrinterTransport, parse_probe_offset
+
+DEBUG = False
+DEBUG_STRINGS = False
+
+
+def show_help():
+    print("")
+    print("\n")
+    print("Key Commands:")
+    print("\t    - => move nozzle lower and retest")
+    print("\t    + => move nozzle higher and retest")
+    print("\t    f => toggle fine-tune mode (0.1 or 0.01 increments)")
+    print("\t   up => increase move increment")
+    print("\t down => decrease move increment")
+    print("\t    r => hop up and repeat last test")
+    print("\tenter => accept current offset")
+    print("\t  0-9 => enter offset value")
+    print("\t    e => export temperature telemetry")
+    print("\t    h => display help")
+    print("\t    q => quit without saving")
+    print("\n")
+
+
+def show_search_help():
+    print("")
+    print("\n")
+    print("Key Commands:")
+    print("\t    t => too tight, paper drags or is pinned")
+    print("\t    l => too loose, no drag at all")
+    print("\tenter => accept current offset")
+    print("\t    h => display help")
+    print("\t    q => quit without saving")
+    print("\n")
+
+
+def clear_prompt_line():
+    print("\r                                                                                                \r", end="")
+
+
+class ZOffsetAdjuster(PrinterTransport):
+    ABORTED = False
+    BED_TEMP = 0
+    BED_X = 220.0  # bed size (mm), Z is homed at the centre
+    BED_Y = 220.0
+    CURRENT_Z_OFFSET = ""
+    DEBUG_STRINGS = DEBUG_STRINGS
+    DISPLAY_DELAY = 3  # length of time to show temporary message (secs)
+    ENTRY_DELAY = 0.5  # time to show the last digit of a manually entered offset (secs)
+    EXTRUDER_TEMP = 0
+    HEAT_TOLERANCE = TOLERANCE  # degrees from the target a stable heater stays within
+    HEAT_WINDOW = WINDOW  # temperature reports that must be stable before the paper test
+    HEAT_SETTLE_LIMIT = SETTLE_LIMIT  # reports near the target before at-target-and-powered-down is enough
+    HOP_HEIGHT = 1.0  # lift before re-approaching a test offset (mm)
+    HOP_SPEED = "F1200"  # feed rate for the lift and the final approach
+    ITERATION_TIMES = ()  # seconds each test move took in the last obtain_z_offset
+    KEYS = ConsoleKeys()
+    MONITOR = None
+    MOVEMENT_SPEED = "F4800"
+    OFFSET_VALUE: float = 0.0
+    OFFSET_INCREMENT = 0.0
+    PRINTER_NAME = ""  # farm name of the printer, output files are told apart by it (or by the port)
+    RECORD_FILE = ""  # binary capture of all serial traffic, empty when not recording
+    SAVED_OFFSET = None  # last good offset, from the printer or the calibration store
+    SAVED_SEARCH_SPAN = 0.25  # bisection bracket around a saved offset (mm either way)
+    SEARCH_MODE = "linear"  # paper test: "linear" steps the offset by hand, "bisect" halves a bracket
+    SEARCH_SPAN = 1.0  # bisection bracket around the configured initial offset (mm either way)
+    SETTINGS = None  # PrinterSettings, what the printer has been told
+    SESSION_STARTED = None  # wall clock time the printer was connected
+    STORE_FILE = STORE_FILE  # calibration history, empty when not stored
+    SURVEY = False  # paper test at several points of the bed instead of the centre only
+    SURVEY_GRID = "3x3"  # columns x rows, used when SURVEY_POINTS is empty
+    SURVEY_LIFT = 3.0  # nozzle lift above the last test offset for travel between points (mm)
+    SURVEY_MARGIN = 30.0  # distance of the outer grid points from the bed edges (mm)
+    SURVEY_POINTS = ()  # explicit [x, y] points
+    SURVEY_RESULT = None  # OffsetSurvey of the last survey
+    TELEMETRY = None
+    TELEMETRY_CAPACITY = CAPACITY  # samples kept per heater
+    TELEMETRY_FILE = ""  # CSV the telemetry is exported to at the end, empty when not exported
+    TELEMETRY_INTERVAL = REPORT_INTERVAL  # seconds between temperature reports (M155 S<n>)
+    TEST_Z = None  # last test offset the nozzle was moved to, None before the first test move
+    TRACE_FILE = ""  # JSONL command trace, empty when tracing is off
+    TRACER = None
+    TRAVEL_SPEED = "F6000"  # feed rate for X/Y moves between test points
+    Z_OFFSET = 0.0
+
+    def start_reader(self):
+        if self.RECORD_FILE != "":
+            self.PRINTER = RecordingPort(self.PRINTER, self.printer_file(self.RECORD_FILE))
+        self.SESSION_STARTED = time.time()
+        super().start_reader()
+
+    def attach_handlers(self):
+        self.SETTINGS = PrinterSettings()
+        # temperature reports go into the ring buffers for the whole session
+        self.TELEMETRY = Telemetry(self.READER, self.TELEMETRY_CAPACITY)
+        self.TELEMETRY.start()
+        if self.TRACE_FILE != "":
+            self.TRACER = CommandTracer(self.printer_file(self.TRACE_FILE))
+            self.READER.tracer = self.TRACER
+            self.COMMANDS.tracer = self.TRACER
+
+    def stop_trace(self):
+        if self.TRACER is not None:
+            self.TRACER.close()
+            self.TRACER.print_summary()
+            self.TRACER = None
+
+    def printer_file(self, path):
+        # path with the printer in its name, e.g. trace.jsonl -> trace-ttyUSB0.jsonl, so printers
+        # calibrated side by side or back to back do not write over each other's file
+        label = self.PRINTER_NAME or re.sub(r"^/dev/", "", self.PRINTER_PORT) or "printer"
+        root, ext = os.path.splitext(path)
+        return root + "-" + re.sub(r"[^A-Za-z0-9_.-]", "_", label) + ext
+
+    def trace_phase(self, name):
+        if self.TRACER is not None:
+            self.TRACER.start_phase(name)
+
+    def load_config(self):
+        print("Loading configuration...", end="")
+        with open("config.json", "r") as cfg:
+            config = json.load(cfg)
+        self.apply_config(config)
+        print("ok.")
+
+    def apply_config(self, config):
+        if DEBUG:  # use lower temps for debugging
+            self.BED_TEMP = "25"
+            self.EXTRUDER_TEMP = "40"
+        else:
+            self.BED_TEMP = config["temps"]["bed"]
+            self.EXTRUDER_TEMP = config["temps"]["extruder"]
+        self.HEAT_TOLERANCE = float(config["temps"].get("tolerance", self.HEAT_TOLERANCE))
+        self.HEAT_WINDOW = int(config["temps"].get("window", self.HEAT_WINDOW))
+        self.HEAT_SETTLE_LIMIT = int(config["temps"].get("settle_limit", self.HEAT_SETTLE_LIMIT))
+        self.OFFSET_VALUE = config["offset"]["initial"]
+        self.OFFSET_INCREMENT = config["offset"]["increment"]
+        self.SEARCH_MODE = config["offset"].get("mode", self.SEARCH_MODE)
+        self.HOP_HEIGHT = float(config["offset"].get("hop", self.HOP_HEIGHT))
+        self.HOP_SPEED = config["offset"].get("hop_speed", self.HOP_SPEED)
+        self.PRINTER_NAME = config.get("name", self.PRINTER_NAME)  # farm sections are named
+        printer_port = config["printer_port"]["port"]
+        if printer_port != "null":
+            self.PRINTER_PORT = printer_port
+        baudrate = config["printer_port"].get("baud", "auto")
+        if baudrate != "auto":
+            self.BAUD_RATES = (int(baudrate),)
+        trace_file = config.get("trace", {}).get("file", "null")
+        if trace_file != "null":
+            self.TRACE_FILE = trace_file
+        record_file = config.get("record", {}).get("file", "null")
+        if record_file != "null":
+            self.RECORD_FILE = record_file
+        bed = config.get("bed", {})
+        self.BED_X = float(bed.get("x", self.BED_X))
+        self.BED_Y = float(bed.get("y", self.BED_Y))
+        survey = config.get("survey", {})
+        self.SURVEY_GRID = survey.get("grid", self.SURVEY_GRID)
+        self.SURVEY_MARGIN = float(survey.get("margin", self.SURVEY_MARGIN))
+        self.SURVEY_POINTS = survey.get("points", self.SURVEY_POINTS)
+        self.TRAVEL_SPEED = survey.get("travel_speed", self.TRAVEL_SPEED)
+        telemetry = config.get("telemetry", {})
+        self.TELEMETRY_INTERVAL = int(telemetry.get("interval", self.TELEMETRY_INTERVAL))
+        self.TELEMETRY_CAPACITY = int(telemetry.get("capacity", self.TELEMETRY_CAPACITY))
+        telemetry_file = telemetry.get("file", "null")
+        if telemetry_file != "null":
+            self.TELEMETRY_FILE = telemetry_file
+        daemon_socket = config.get("daemon", {}).get("socket", "default")
+        if daemon_socket == "null":
+            self.DAEMON_SOCKET = ""
+        elif daemon_socket != "default":
+            self.DAEMON_SOCKET = os.path.expanduser(daemon_socket)
+        store_file = config.get("store", {}).get("file", "default")
+        if store_file == "null":
+            self.STORE_FILE = ""
+        elif store_file != "default":
+            self.STORE_FILE = os.path.expanduser(store_file)
+
+    def send_setting(self, setting, value, msg):
+        # like send_sync_cmd, but nothing is sent when the printer already has the value
+        cmd = self.SETTINGS.change(setting, value)
+        if cmd is None:
+            print(msg + "unchanged")
+        else:
+            self.send_sync_cmd(cmd, msg)
+
+    def home_printer(self):
+        # Marlin only answers G28 with "ok" once homing has completed
+        print("Homing printer...", end="")
+        # show progress while the printer reports it is busy homing
+        self.READER.route(BUSY, lambda line: print(".", end=""))
+        self.wait_for_cmd("G28")
+        self.READER.route(BUSY, None)
+        print("OK")
+
+    def adjust_z_offset(self):
+        self.setup_z_offset_measurement()
+        self.offset_test()
+
+    def offset_test(self):
+        if self.SURVEY:
+            self.survey_z_offset()
+        else:
+            self.paper_test()
+
+    def paper_test(self):
+        if self.SEARCH_MODE == "bisect":
+            self.obtain_z_offset_bisect()
+        else:
+            self.obtain_z_offset()
+
+    def setup_commands(self):
+        # (command, message, is a move) for the Z-offset measurement setup, without the
+        # settings the printer already has; the cleared offset is not saved to EEPROM
+        commands = [
+            (self.SETTINGS.change(ENDSTOPS, True), "enabling software endstops", False),
+            (self.SETTINGS.change(PROBE_Z_OFFSET, 0.0), "clearing current Z-offset", False),
+            ("G28", "homing printer", False),
+            ("G1 X{0:g} Y{1:g} {2}".format(self.BED_X / 2, self.BED_Y / 2, self.TRAVEL_SPEED),
+             "moving nozzle to bed center", True),
+            (self.SETTINGS.change(ENDSTOPS, False), "disabling software endstops", False),
+        ]
+        return [command for command in commands if command[0] is not None]
+
+    def setup_z_offset_measurement(self):
+        print("\nSetting up for Z-offset measurement...")
+        for cmd, msg, is_move in self.setup_commands():
+            if is_move:
+                self.send_sync_move_cmd(cmd, "\t" + msg + "...")
+            else:
+                self.send_sync_cmd(cmd, "\t" + msg + "...")
+        self.TEST_Z = None  # homed, the nozzle is above every test offset
+        print("Setup complete.")
+
+    def obtain_z_offset(self):
+        print("\nBeginning Z-offset testing...\n")
+        print("Insert paper, press any key to continue...", end="")
+        event = self.KEYS.read_event(suppress=True)
+        print("")
+        fine_tune_mode = False
+        offset = self.OFFSET_VALUE
+        offset_float = float(offset)
+        increment = self.OFFSET_INCREMENT
+        offset_accepted = False
+        self.ITERATION_TIMES = []
+        # keys are read while the nozzle moves, presses during a move fold into its next target
+        mover = MoveCoalescer(self.COMMANDS, self.start_test_move, self.test_move_arrived, position=self.TEST_Z)
+        move_to = None  # offset of the last move requested
+        while not offset_accepted:
+            if float(offset) != move_to:
+                self.request_test_move(mover, offset)
+                move_to = float(offset)
+            event = self.KEYS.read_event()
+            if event.event_type == KEY_DOWN:
+                key = event.name
+                if DEBUG_STRINGS:
+                    print(f'Pressed: {key}')
+                # Note: using if's instead of case for older Pythons
+                if key.isdigit():
+                    # event = None
+                    clear_prompt_line()
+                    manual_offset = "-" + key
+                    offset_entered = False
+                    decimal_point_entered = False
+                    print("Enter desired offset -N.NN (esc to abort): " + manual_offset, end="")
+                    while not offset_entered:
+                        o_event = self.KEYS.read_event()
+                        if o_event.event_type == KEY_DOWN:
+                            o_key = o_event.name
+                            if o_key == "decimal":
+                                if not decimal_point_entered:
+                                    print(".", end="")
+                                    manual_offset += "."
+                                    decimal_point_entered = True
+                            elif o_key.isdigit():
+                                manual_offset += o_key
+                                print(o_key, flush=True, end="")
+                            if len(manual_offset) == 5:  # 3 digits, a decimal point, and leading minus sign
+                                time.sleep(self.ENTRY_DELAY)  # short delay for last digit to be displayed
+                                offset_entered = True
+                    offset = manual_offset
+                elif key == '-':  # move nozzle lower (make offset more negative)
+                    offset_float = float(offset)
+                    increment_float = float(increment)
+                    offset_float -= increment_float
+                    offset = str(round(offset_float, 2))
+                elif key == '+':  # move nozzle higher (make offset less negative)
+                    offset_float = float(offset)
+                    increment_float = float(increment)
+                    offset_float += increment_float
+                    offset = str(round(offset_float, 2))
+                elif key == 'r':  # repeat last measurement, hops up and comes back
+                    self.request_test_move(mover, offset, repeat=True)
+                    continue
+                elif key == 'f':  # toggle fine-tune mode
+                    clear_prompt_line()
+                    if fine_tune_mode:
+                        fine_tune_mode = False
+                        increment = self.OFFSET_INCREMENT
+                        print("Adjustment increment reset to {0:1.1f}".format(float(increment)), end="")
+                    else:
+                        fine_tune_mode = True
+                        increment = 0.01
+                        print("Adjustment increment set to {0:1.2f}".format(float(increment)), end="")
+                    time.sleep(self.DISPLAY_DELAY)
+                    clear_prompt_line()
+                    continue
+                elif key == 'e':
+                    clear_prompt_line()
+                    self.export_telemetry(self.TELEMETRY_FILE or EXPORT_FILE)
+                elif key == 'h':
+                    show_help()
+                elif key == 'enter':
+                    mover.wait()  # G92 Z0 in finish_session needs the nozzle at the offset
+                    offset_float = float(offset)  # may have been entered manually
+                    self.Z_OFFSET = offset_float
+                    print("\rOffset = {0:.2f}, wait...".format(float(offset)), end="")
+                    print("\n\nZ-offset has been set to {0:.2f}".format((round(self.Z_OFFSET, 2))))
+                    self.report_iteration_times()
+                    break
+                elif key == 'q':
+                    mover.wait()
+                    self.ABORTED = True
+                    break
+        self.TEST_Z = mover.position
+
+    def request_test_move(self, mover, offset, repeat=False):
+        clear_prompt_line()
+        print("\rOffset = {0:.2f}, wait...".format(float(offset)), end="")
+        mover.request(float(offset), repeat)
+
+    def test_move_arrived(self, offset, elapsed):
+        # called from the serial reader thread once no newer offset is pending
+        self.ITERATION_TIMES.append(elapsed)
+        print(" ({0:.1f}s) Test now then enter a command (h for help): ".format(elapsed), end="", flush=True)
+
+    def survey_points(self):
+        if self.SURVEY_POINTS:
+            return [(float(x), float(y)) for x, y in self.SURVEY_POINTS]
+        columns, rows = parse_grid(self.SURVEY_GRID)
+        return grid_points(self.BED_X, self.BED_Y, self.SURVEY_MARGIN, columns, rows)
+
+    def survey_z_offset(self):
+        # one paper test per point, each starting from the offset accepted at the previous one
+        centre = (self.BED_X / 2, self.BED_Y / 2)
+        points = self.survey_points()
+        survey = OffsetSurvey(points, self.BED_X, self.BED_Y)
+        self.SURVEY_RESULT = survey
+        order = visiting_order(points, centre)  # setup leaves the nozzle at the centre
+        print("\nSurveying {0} points, {1:.0f} mm of travel".format(len(points), tour_length(centre, points, order)))
+        for number, index in enumerate(order, 1):
+            x, y = survey.point(index)
+            self.move_to_point(x, y)
+            print("\nPoint {0} of {1}: X{2:g} Y{3:g}".format(number, len(points), x, y))
+            self.paper_test()
+            if self.ABORTED:
+                return
+            survey.record(index, round(self.Z_OFFSET, 2))
+            self.OFFSET_VALUE = "{0:.2f}".format(self.Z_OFFSET)
+            self.SAVED_OFFSET = self.Z_OFFSET
+        survey.print_report()
+        # Z is homed at the centre, the offset found nearest to it is the one saved
+        nearest = survey.nearest(*centre)
+        self.Z_OFFSET = survey.offsets[nearest]
+        print("Saving the offset found at X{0:g} Y{1:g}: {2:.2f}".format(*survey.point(nearest), self.Z_OFFSET))
+
+    def move_to_point(self, x, y):
+        # lifts clear of the paper before travelling
+        if self.TEST_Z is not None:
+            self.send_printer_cmd("G0 Z{0:.2f} {1}".format(self.TEST_Z + self.SURVEY_LIFT, self.MOVEMENT_SPEED))
+        self.send_printer_cmd("G0 X{0:g} Y{1:g} {2}".format(x, y, self.TRAVEL_SPEED))
+        self.wait_for_cmd("M400")
+        self.TEST_Z = None  # above every test offset
+
+    def search_bracket(self):
+        # (lowest, highest) offset to bisect, narrow when the printer already has an offset saved
+        if self.SAVED_OFFSET is not None:
+            centre, span = self.SAVED_OFFSET, self.SAVED_SEARCH_SPAN
+        else:
+            centre, span = float(self.OFFSET_VALUE), self.SEARCH_SPAN
+        return round(centre - span, 2), round(centre + span, 2)
+
+    def obtain_z_offset_bisect(self):
+        print("\nBeginning Z-offset testing (bisection)...\n")
+        print("Insert paper, press any key to continue...", end="")
+        self.KEYS.read_event(suppress=True)
+        print("")
+        low, high = self.search_bracket()
+        search = BisectionSearch(low, high)
+        self.ITERATION_TIMES = []
+        offset = None
+        test_offset = True
+        while not search.done():
+            if test_offset:
+                offset = search.next_offset()
+                clear_prompt_line()
+                print("\rOffset = {0:.2f}, wait...".format(offset), end="")
+                elapsed = self.test_move(offset)
+                print(" ({0:.1f}s) Test now, t = too tight, l = too loose (h for help): ".format(elapsed), end="")
+            test_offset = False
+            event = self.KEYS.read_event()
+            if event.event_type != KEY_DOWN:
+                continue
+            key = event.name
+            if DEBUG_STRINGS:
+                print(f'Pressed: {key}')
+            if key == 't':
+                search.too_tight()
+                test_offset = True
+            elif key == 'l':
+                search.too_loose()
+                test_offset = True
+            elif key == 'h':
+                show_search_help()
+            elif key == 'enter':  # the operator is happy with the offset under test
+                self.Z_OFFSET = offset
+                break
+            elif key == 'q':
+                self.ABORTED = True
+                return
+        else:
+            self.Z_OFFSET = search.result()
+        print("\n\nZ-offset has been set to {0:.2f} after {1} test moves".format(self.Z_OFFSET, search.moves))
+        self.report_iteration_times()
+
+    def test_move(self, offset):
+        # moves the nozzle to a test offset and waits, returns how long the move took
+        started = time.monotonic()
+        futures = self.start_test_move(offset, self.TEST_Z)
+        self.COMMANDS.wait(futures[-1])
+        self.TEST_Z = offset
+        elapsed = time.monotonic() - started
+        self.ITERATION_TIMES.append(elapsed)
+        return elapsed
+
+    def start_test_move(self, offset, from_offset):
+        # Queues the move from from_offset (None: somewhere above) to offset and
+        # returns its futures, the last one (M400) resolves once it has finished.
+        # The last move is always downwards so Z backlash is taken up the same
+        # way for every test: going up or retesting overshoots by HOP_HEIGHT
+        # with a relative move and comes back down.
+        if from_offset is None or offset < from_offset:
+            # from the setup height or from a looser offset, already above
+            commands = ["G0 Z{0:.2f} {1}".format(offset, self.MOVEMENT_SPEED)]
+        else:
+            lift = round(offset - from_offset + self.HOP_HEIGHT, 2)
+            commands = ["G91",
+                        "G0 Z{0:.2f} {1}".format(lift, self.HOP_SPEED),
+                        "G0 Z-{0:.2f} {1}".format(self.HOP_HEIGHT, self.HOP_SPEED),
+                        "G90"]
+        # M400 is only acknowledged once all moves have finished
+        return [self.send_printer_cmd(cmd) for cmd in commands + ["M400"]]
+
+    def report_iteration_times(self):
+        # per-printer tuning aid for HOP_HEIGHT and HOP_SPEED
+        times = self.ITERATION_TIMES
+        if times:
+            print("{0} test moves, {1:.1f}s average, {2:.1f}s longest".format(
+                len(times), sum(times) / len(times), max(times)))
+
+    def finish_session(self):
+        # returns the exit status: 0 when the new offset was saved, 1 when aborted
+        self.trace_phase("finish")
+        if not self.ABORTED:
+            print("\nFinishing up...")
+            self.send_setting(ENDSTOPS, True, "\tre-enabling software endstops...")
+            self.send_sync_cmd("G92 Z0", "\tsetting Z = 0 to current Z position...")
+            msg = "\tsetting Z-offset value to {0:.2f}...".format(round(float(self.Z_OFFSET), 2))
+            self.send_setting(PROBE_Z_OFFSET, float(self.Z_OFFSET), msg)
+            # the only EEPROM write of the session, skipped when the saved offset was accepted again
+            cmd = self.SETTINGS.commit()
+            if cmd is None:
+                print("\tsettings unchanged, EEPROM not written")
+            else:
+                self.send_sync_cmd(cmd, "\tsaving settings to EEPROM...")
+            self.send_setting(BED_TARGET, 0, "\tturning off bed heater...")
+            self.send_setting(HOTEND_TARGET, 0, "\tturning off extruder heater...")
+            self.send_sync_cmd("G0 Z10", "\traising nozzle...")
+            self.end_temp_reporting()
+            self.stop_trace()
+            print("Finished, exiting...")
+            return 0
+        else:
+            print("\nProcessing aborted...")
+            self.send_setting(ENDSTOPS, True, "\tre-enabling software endstops...")
+            self.send_setting(BED_TARGET, 0, "\tturning off bed heater...")
+            self.send_setting(HOTEND_TARGET, 0, "\tturning off extruder heater...")
+            # nothing was saved, the printer only needs the values it had before the session
+            for cmd in self.SETTINGS.rollback():
+                self.send_sync_cmd(cmd, "\trestoring previous Z-offset (" + self.CURRENT_Z_OFFSET + ")...")
+            self.end_temp_reporting()
+            self.stop_trace()
+            print("Exiting...")
+            return 1
+
+    def end_temp_reporting(self):
+        # leave the printer reporting every second as before, keep the telemetry if asked to
+        if self.TELEMETRY_INTERVAL != 1:
+            self.wait_for_cmd("M155 S1")
+        self.export_telemetry()
+
+    def save_current_z_offset(self):
+        print("Saving current Z-offset value: ", end="")
+        # the offset report arrives before the "ok"
+        self.read_probe_offset_report(self.wait_for_cmd("M851"))
+        print(self.CURRENT_Z_OFFSET)
+        self.recall_calibration()
+
+    def read_probe_offset_report(self, responses):
+        current_offset = parse_probe_offset(responses)
+        # the offset read at the start is what the EEPROM holds, abort rolls back to it
+        self.SETTINGS.learn(PROBE_Z_OFFSET, float(current_offset))
+        self.SETTINGS.snapshot()
+        # keep the magnitude only for display and the starting offset
+        current_offset = current_offset.lstrip("-")
+        self.CURRENT_Z_OFFSET = current_offset
+        # if the Z probe offset is already set, start with that instead of the default in config
+        if float(current_offset) > 0.5:
+            self.OFFSET_VALUE = "-" + current_offset
+            self.SAVED_OFFSET = -float(current_offset)
+
+    def printer_identity(self):
+        return PrinterIdentity(self.MACHINE_FIRMWARE_NAME, self.MACHINE_FIRMWARE_VERSION,
+                               self.MACHINE_UUID, self.PRINTER_PORT)
+
+    def recall_calibration(self):
+        # an aborted session leaves the printer with no offset saved, start from the last accepted one
+        if self.SAVED_OFFSET is not None or self.STORE_FILE == "":
+            return
+        last = CalibrationStore(self.STORE_FILE).last_accepted(self.printer_identity())
+        if last is None:
+            return
+        self.SAVED_OFFSET = last.z_offset
+        self.OFFSET_VALUE = "{0:.2f}".format(last.z_offset)
+        print("Starting from the last calibration ({0}): {1}".format(
+            time.strftime("%Y-%m-%d %H:%M", time.localtime(last.finished_at)), self.OFFSET_VALUE))
+
+    def store_calibration(self, pipeline=None):
+        if self.STORE_FILE == "":
+            return
+        timings = {}
+        if pipeline is not None:
+            timings = {stage.name: stage.elapsed for stage in pipeline.stages}
+            timings["heat wait"] = pipeline.heat_wait
+        timings["test moves"] = list(self.ITERATION_TIMES)
+        CalibrationStore(self.STORE_FILE).record(
+            self.printer_identity(), not self.ABORTED, None if self.ABORTED else round(self.Z_OFFSET, 2),
+            float(self.BED_TEMP), float(self.EXTRUDER_TEMP), self.SERIAL_SPEED, self.SESSION_STARTED, timings)
+
+    def preheat(self):
+        self.start_preheat()
+        self.wait_for_preheat()
+
+    def start_preheat(self):
+        # both heaters ramp at once, a single monitor watches the shared report
+        print("Preheating bed and extruder...")
+        self.start_monitor()
+        self.wait_for_cmd("M155 S" + str(self.TELEMETRY_INTERVAL))  # temp reporting stays on for telemetry
+        self.wait_for_cmd(self.SETTINGS.change(BED_TARGET, float(self.BED_TEMP)))
+        self.wait_for_cmd(self.SETTINGS.change(HOTEND_TARGET, float(self.EXTRUDER_TEMP)))
+
+    def start_monitor(self):
+        monitor = TemperatureMonitor(self.TELEMETRY)
+        monitor.add_heater("Bed", BED, self.BED_TEMP, 1, self.HEAT_TOLERANCE, self.HEAT_WINDOW,
+                           self.HEAT_SETTLE_LIMIT)
+        monitor.add_heater("Extruder", EXTRUDER, self.EXTRUDER_TEMP, 127, self.HEAT_TOLERANCE, self.HEAT_WINDOW,
+                           self.HEAT_SETTLE_LIMIT)
+        monitor.start()
+        self.MONITOR = monitor
+
+    def wait_for_preheat(self):
+        print("\nWaiting for heaters...")
+        monitor = self.MONITOR
+        monitor.wait()
+        monitor.stop()
+        print("Heaters ready, {0:.0f}s saved by heating both at once.".format(monitor.time_saved()))
+        rates = [(name, self.TELEMETRY.heating_rate(key)) for name, key in (("Bed", BED), ("Extruder", EXTRUDER))]
+        rates = [(name, rate) for name, rate in rates if rate is not None]  # none when already hot
+        if rates:
+            print("Heating rates: " + ", ".join("{0} {1:.2f} C/s".format(name, rate) for name, rate in rates))
+
+    def export_telemetry(self, path=None):
+        path = path or self.TELEMETRY_FILE
+        if self.TELEMETRY is None or path == "":
+            return
+        path = self.printer_file(path)
+        rows = self.TELEMETRY.export(path)
+        print("Telemetry: {0} samples written to {1}".format(rows, path))
+
+    def run_session(self):
+        # setup that does not need heat runs while the heaters ramp, only the paper test waits
+        pipeline = SessionPipeline(self.start_preheat, self.wait_for_preheat, on_stage=self.trace_phase)
+        pipeline.add_stage("read current Z-offset", self.save_current_z_offset)
+        pipeline.add_stage("setup", self.setup_z_offset_measurement)
+        pipeline.add_stage("paper test", self.offset_test, needs_heat=True)
+        pipeline.run()
+        return pipeline
+
+
+
+def calibrate(port=None, script=None, search=None, survey=False):
+    # one full session, returns the exit status
+    adjuster = ZOffsetAdjuster()
+    adjuster.load_config()
+    if port is not None:
+        adjuster.PRINTER_PORT = port
+    if search is not None:
+        adjuster.SEARCH_MODE = search
+    if survey:
+        adjuster.SURVEY = True
+    if script is not None:
+        script.apply(adjuster)
+    # adjuster.find_printer()
+    try:
+        status = adjuster.init_printer()
+    except OSError as e:  # e.g. the serial daemon has no printer on that port
+        print(str(e))
+        status = False
+    if not status:
+        print("could not connect to a printer, no printer found or port busy.  Exiting.")
+        return 1
+    pipeline = adjuster.run_session()
+    status = adjuster.finish_session()
+    adjuster.store_calibration(pipeline)
+    adjuster.close_printer()
+    return status
+
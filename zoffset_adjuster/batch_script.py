@@ -0,0 +1,75 @@
+# Batch scripts for unattended calibration.
+# A script replaces the operator at the keyboard: it is turned into the key
+# presses obtain_z_offset already understands, so a batch run issues the
+# same G-code as an interactive one.  Tokens are separated by spaces, commas
+# or new lines, "#" starts a comment:
+#
+#   bed=60 extruder=220     target temperatures (optional)
+#   -2.45                   go to this offset (-N.NN) and test it
+#   + - r f                 the interactive keys
+#   tight | loose           answers for the bisection search (--search bisect)
+#   accept | abort          save the current offset or restore the old one
+#
+# A script that does not end with accept or abort is aborted.  In a bed
+# survey each point is accepted in turn, the next point's "press any key"
+# is answered after every accept.
+
+import re
+import sys
+
+from .key_input import ScriptedKeys
+
+OFFSET = re.compile(r"^-(\d)\.(\d)(\d)$")  # the only form manual offset entry accepts
+KEYS = {"+": "+", "-": "-", "r": "r", "f": "f", "tight": "t", "loose": "l",
+        "accept": "enter", "abort": "q"}
+
+
+class BatchScript:
+    def __init__(self, text):
+        self.bed_temp = None
+        self.extruder_temp = None
+        self.keys = ["space"]  # answers "Insert paper, press any key"
+        self.decided = False
+        tokens = re.sub(r"#[^\n]*", "", text).replace(",", " ").split()
+        for token in tokens:
+            self.add_token(token)
+        if not self.decided:
+            self.keys.append("q")
+
+    def add_token(self, token):
+        if token.startswith("bed="):
+            self.bed_temp = token[4:]
+        elif token.startswith("extruder="):
+            self.extruder_temp = token[9:]
+        elif token.lower() in KEYS:
+            self.keys.append(KEYS[token.lower()])
+            if token.lower() == "accept":
+                self.keys.append("space")  # the next survey point, if any
+            self.decided = token.lower() in ("accept", "abort")
+        else:
+            offset = OFFSET.match(token)
+            if offset is None:
+                raise ValueError("invalid batch script token: " + token)
+            self.decided = False
+            self.keys.extend([offset.group(1), "decimal", offset.group(2), offset.group(3)])
+
+    def apply(self, adjuster):
+        if self.bed_temp is not None:
+            adjuster.BED_TEMP = self.bed_temp
+        if self.extruder_temp is not None:
+            adjuster.EXTRUDER_TEMP = self.extruder_temp
+        adjuster.KEYS = ScriptedKeys(self.keys)
+        adjuster.DISPLAY_DELAY = 0  # nobody is reading the console
+        adjuster.ENTRY_DELAY = 0
+
+
+def load_batch_script(inline=None, path=None):
+    # from the command line, a file, or stdin when path is "-"; None when running interactively
+    if inline is not None:
+        return BatchScript(inline)
+    if path is None:
+        return None
+    if path == "-":
+        return BatchScript(sys.stdin.read())
+    with open(path, "r") as script_file:
+        return BatchScript(script_file.read())
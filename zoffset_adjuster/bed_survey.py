@@ -0,0 +1,162 @@
+# Multi-point bed survey.
+# The paper test is repeated at several points of the bed in one heat cycle.
+# Points come from a grid ("3x3") or an explicit list in config.json and are
+# visited in a short tour: nearest neighbour from where the nozzle is, then
+# improved with 2-opt.  The accepted offsets are kept in flat arrays and a
+# plane fitted through them gives the bed tilt.
+
+import math
+from array import array
+
+
+def parse_grid(grid):
+    # "3x3" -> (3, 3)
+    columns, rows = grid.lower().split("x")
+    return int(columns), int(rows)
+
+
+def grid_points(size_x, size_y, margin, columns, rows):
+    # evenly spaced points, margin mm in from the bed edges
+    def spaced(size, count):
+        if count == 1:
+            return [size / 2]
+        step = (size - 2 * margin) / (count - 1)
+        return [margin + i * step for i in range(count)]
+    return [(x, y) for y in spaced(size_y, rows) for x in spaced(size_x, columns)]
+
+
+def distance(a, b):
+    return math.hypot(a[0] - b[0], a[1] - b[1])
+
+
+def tour_length(start, points, order):
+    length = 0.0
+    position = start
+    for index in order:
+        length += distance(position, points[index])
+        position = points[index]
+    return length
+
+
+def visiting_order(points, start):
+    # open tour from start through every point: nearest neighbour, then 2-opt until no reversal helps
+    remaining = list(range(len(points)))
+    order = []
+    position = start
+    while remaining:
+        nearest = min(remaining, key=lambda i: distance(position, points[i]))
+        remaining.remove(nearest)
+        order.append(nearest)
+        position = points[nearest]
+    improved = True
+    while improved:
+        improved = False
+        for i in range(len(order) - 1):
+            before = start if i == 0 else points[order[i - 1]]
+            for j in range(i + 1, len(order)):
+                # reversing order[i..j] swaps edges (before, i) + (j, after) for (before, j) + (i, after)
+                after = points[order[j + 1]] if j + 1 < len(order) else None
+                old = distance(before, points[order[i]])
+                new = distance(before, points[order[j]])
+                if after is not None:
+                    old += distance(points[order[j]], after)
+                    new += distance(points[order[i]], after)
+                if new < old - 1e-9:
+                    order[i:j + 1] = reversed(order[i:j + 1])
+                    improved = True
+    return order
+
+
+def determinant(m):
+    return (m[0][0] * (m[1][1] * m[2][2] - m[1][2] * m[2][1])
+            - m[0][1] * (m[1][0] * m[2][2] - m[1][2] * m[2][0])
+            + m[0][2] * (m[1][0] * m[2][1] - m[1][1] * m[2][0]))
+
+
+class OffsetSurvey:
+    def __init__(self, points, size_x, size_y):
+        self.size_x = size_x
+        self.size_y = size_y
+        self.xs = array("d", (x for x, y in points))
+        self.ys = array("d", (y for x, y in points))
+        self.offsets = array("d", [math.nan] * len(points))  # nan until measured
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def point(self, index):
+        return self.xs[index], self.ys[index]
+
+    def record(self, index, offset):
+        self.offsets[index] = offset
+
+    def measured(self):
+        return [i for i in range(len(self.offsets)) if not math.isnan(self.offsets[i])]
+
+    def spread(self):
+        values = [self.offsets[i] for i in self.measured()]
+        return max(values) - min(values) if values else None
+
+    def nearest(self, x, y):
+        # index of the measured point closest to (x, y), or None
+        measured = self.measured()
+        if not measured:
+            return None
+        return min(measured, key=lambda i: distance((x, y), self.point(i)))
+
+    def plane(self):
+        # least squares fit offset = a + b * x + c * y, None if the points are collinear
+        measured = self.measured()
+        n = len(measured)
+        if n < 3:
+            return None
+        sx = sum(self.xs[i] for i in measured)
+        sy = sum(self.ys[i] for i in measured)
+        sz = sum(self.offsets[i] for i in measured)
+        sxx = sum(self.xs[i] ** 2 for i in measured)
+        syy = sum(self.ys[i] ** 2 for i in measured)
+        sxy = sum(self.xs[i] * self.ys[i] for i in measured)
+        sxz = sum(self.xs[i] * self.offsets[i] for i in measured)
+        syz = sum(self.ys[i] * self.offsets[i] for i in measured)
+        matrix = ((n, sx, sy), (sx, sxx, sxy), (sy, sxy, syy))
+        det = determinant(matrix)
+        if abs(det) <= 1e-9 * n * sxx * syy:
+            return None
+        rhs = (sz, sxz, syz)
+        coefficients = []
+        for column in range(3):
+            replaced = [list(row) for row in matrix]
+            for row in range(3):
+                replaced[row][column] = rhs[row]
+            coefficients.append(determinant(replaced) / det)
+        return tuple(coefficients)
+
+    def tilt(self):
+        # offset change across the whole bed along X and along Y (mm), or None
+        plane = self.plane()
+        if plane is None:
+            return None
+        return plane[1] * self.size_x, plane[2] * self.size_y
+
+    def print_report(self):
+        # rows from the back of the bed to the front, like looking down at it
+        columns = sorted(set(self.xs))
+        print("\nBed survey, Z-offset at each point:")
+        print("       " + "".join("{0:>8}".format("X{0:g}".format(x)) for x in columns))
+        for y in sorted(set(self.ys), reverse=True):
+            cells = []
+            for x in columns:
+                cell = ""
+                for i in range(len(self.offsets)):
+                    if self.xs[i] == x and self.ys[i] == y and not math.isnan(self.offsets[i]):
+                        cell = "{0:.2f}".format(self.offsets[i])
+                cells.append("{0:>8}".format(cell))
+            print("{0:>7}".format("Y{0:g}".format(y)) + "".join(cells))
+        spread = self.spread()
+        if spread is not None:
+            print("Spread: {0:.2f} mm".format(spread))
+        tilt = self.tilt()
+        if tilt is not None:
+            # + 0.0 turns a rounded -0.00 into 0.00
+            print("Tilt across the bed: X {0:+.2f} mm, Y {1:+.2f} mm".format(
+                round(tilt[0], 2) + 0.0, round(tilt[1], 2) + 0.0))
@@ -0,0 +1,128 @@
+# Local calibration history.
+# Every finished session is stored in a small SQLite database, keyed by the
+# printer's identity (firmware name and version, UUID and port) so the next
+# session on the same printer can start from the last accepted offset, and
+# the calibration history of a whole farm can be looked up in one place.
+#
+#   python -m zoffset_adjuster.calibration_store [--uuid UUID] [--port PORT] [--limit N]
+
+import argparse
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+STORE_FILE = os.path.join(os.path.expanduser("~"), ".zoffset_adjuster.db")
+
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS calibrations (
+        id INTEGER PRIMARY KEY,
+        firmware_name TEXT NOT NULL,
+        firmware_version TEXT NOT NULL,
+        uuid TEXT NOT NULL,
+        port TEXT NOT NULL,
+        accepted INTEGER NOT NULL,
+        z_offset REAL,
+        bed_temp REAL,
+        extruder_temp REAL,
+        baud INTEGER,
+        started_at REAL,
+        finished_at REAL NOT NULL,
+        timings TEXT
+    )""",
+    # many printers share Marlin's default UUID, so the port is part of the identity
+    """CREATE INDEX IF NOT EXISTS calibrations_printer
+        ON calibrations (uuid, firmware_name, firmware_version, port, accepted, finished_at)""",
+    "CREATE INDEX IF NOT EXISTS calibrations_finished ON calibrations (finished_at)",
+)
+
+COLUMNS = ("id", "firmware_name", "firmware_version", "uuid", "port", "accepted", "z_offset",
+           "bed_temp", "extruder_temp", "baud", "started_at", "finished_at", "timings")
+
+
+class PrinterIdentity:
+    def __init__(self, firmware_name, firmware_version, uuid, port):
+        self.firmware_name = firmware_name
+        self.firmware_version = firmware_version
+        self.uuid = uuid
+        self.port = port
+
+    def key(self):
+        return self.uuid, self.firmware_name, self.firmware_version, self.port
+
+
+class Calibration:
+    def __init__(self, row):
+        for name, value in zip(COLUMNS, row):
+            setattr(self, name, value)
+        self.accepted = bool(self.accepted)
+        self.timings = json.loads(self.timings) if self.timings else {}
+
+
+class CalibrationStore:
+    def __init__(self, path=STORE_FILE):
+        self.path = path
+        with closing(self.connect()) as db, db:
+            for statement in SCHEMA:
+                db.execute(statement)
+
+    def connect(self):
+        # a connection per call, sessions of a farm finish on different threads
+        return sqlite3.connect(self.path, timeout=10)
+
+    def record(self, identity, accepted, z_offset, bed_temp, extruder_temp, baud,
+               started_at=None, timings=None):
+        with closing(self.connect()) as db, db:
+            db.execute("INSERT INTO calibrations (uuid, firmware_name, firmware_version, port, accepted, "
+                       "z_offset, bed_temp, extruder_temp, baud, started_at, finished_at, timings) "
+                       "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                       identity.key() + (int(accepted), z_offset, bed_temp, extruder_temp, baud,
+                                         started_at, time.time(), json.dumps(timings or {})))
+
+    def last_accepted(self, identity):
+        # the most recent accepted calibration of this printer, or None
+        with closing(self.connect()) as db:
+            row = db.execute("SELECT " + ", ".join(COLUMNS) + " FROM calibrations "
+                             "WHERE uuid = ? AND firmware_name = ? AND firmware_version = ? AND port = ? "
+                             "AND accepted = 1 ORDER BY finished_at DESC LIMIT 1", identity.key()).fetchone()
+        return Calibration(row) if row is not None else None
+
+    def history(self, uuid=None, port=None, limit=50):
+        # newest first, optionally for one UUID and/or port
+        conditions, params = [], []
+        if uuid is not None:
+            conditions.append("uuid = ?")
+            params.append(uuid)
+        if port is not None:
+            conditions.append("port = ?")
+            params.append(port)
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        with closing(self.connect()) as db:
+            rows = db.execute("SELECT " + ", ".join(COLUMNS) + " FROM calibrations" + where +
+                              " ORDER BY finished_at DESC LIMIT ?", params + [limit]).fetchall()
+        return [Calibration(row) for row in rows]
+
+
+def print_history(calibrations):
+    print("{0:<19} {1:<12} {2:<16} {3:<36} {4:>7} {5:>5} {6:>5} {7:>8}".format(
+        "finished", "port", "firmware", "uuid", "offset", "bed", "ext", "session"))
+    for calibration in calibrations:
+        finished = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(calibration.finished_at))
+        offset = "{0:.2f}".format(calibration.z_offset) if calibration.accepted else "aborted"
+        session = "-"
+        if calibration.started_at is not None:
+            session = "{0:.0f}s".format(calibration.finished_at - calibration.started_at)
+        print("{0:<19} {1:<12} {2:<16} {3:<36} {4:>7} {5:>5.0f} {6:>5.0f} {7:>8}".format(
+            finished, calibration.port, calibration.firmware_name + " " + calibration.firmware_version,
+            calibration.uuid, offset, calibration.bed_temp or 0, calibration.extruder_temp or 0, session))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show the calibration history.")
+    parser.add_argument("--store", default=STORE_FILE, help="database file")
+    parser.add_argument("--uuid", help="only this printer UUID")
+    parser.add_argument("--port", help="only this port")
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+    print_history(CalibrationStore(args.store).history(args.uuid, args.port, args.limit))
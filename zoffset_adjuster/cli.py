@@ -0,0 +1,90 @@
+# Command line entry point, installed as "zoffset".
+#
+#   zoffset calibrate [--port PORT ...] [--batch SCRIPT] [--search bisect] [--survey]
+#   zoffset tester [--stream FILE] [--depth 4] [--rx-buffer 128]
+#   zoffset probe [--port PORT] [--baud RATE]
+#
+# Each subcommand imports only the modules it needs when it runs, so a
+# quick query such as "zoffset probe" does not pay for the keyboard, the
+# calibration store or the port enumeration.
+
+import argparse
+import sys
+
+
+def run_calibrate(args):
+    from .adjuster import calibrate
+    from .batch_script import load_batch_script
+    batch = load_batch_script(args.batch, args.batch_file)
+    exit_status = 0
+    for printer in args.port or [None]:
+        exit_status = max(exit_status, calibrate(printer, batch, args.search, args.survey))
+    return exit_status
+
+
+def run_tester(args):
+    from .tester import run_tester
+    return run_tester(args.stream, args.depth, args.rx_buffer, args.port)
+
+
+def run_probe(args):
+    # firmware and current probe Z-offset, nothing is changed on the printer
+    from .transport import PrinterTransport, parse_probe_offset
+    printer = PrinterTransport()
+    if args.port is not None:
+        printer.PRINTER_PORT = args.port
+    if args.baud is not None:
+        printer.BAUD_RATES = (args.baud,)
+    try:
+        if not printer.init_printer():
+            print("no printer found.")
+            return 1
+        current_offset = parse_probe_offset(printer.wait_for_cmd("M851"))
+    except OSError as e:
+        print(str(e))
+        return 1
+    finally:
+        printer.close_printer()
+    print("Probe Z-offset: " + (current_offset or "not reported"))
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="zoffset", description="Set the Z probe offset of a Marlin printer.")
+    commands = parser.add_subparsers(dest="command", metavar="command")
+    commands.required = True
+
+    calibrate = commands.add_parser("calibrate", help="run a calibration session")
+    calibrate.add_argument("--port", action="append",
+                           help="printer port instead of the config file, repeat to calibrate printers back to back")
+    calibrate.add_argument("--batch", metavar="SCRIPT",
+                           help="run without the keyboard, e.g. \"bed=60 -2.40 - - accept\"")
+    calibrate.add_argument("--batch-file", metavar="PATH", help="read the batch script from a file, - for stdin")
+    calibrate.add_argument("--search", choices=("linear", "bisect"),
+                           help="paper test mode instead of the config file, bisect answers only too tight / too loose")
+    calibrate.add_argument("--survey", action="store_true",
+                           help="test at every survey point in the config file and report the bed tilt")
+    calibrate.set_defaults(run=run_calibrate)
+
+    tester = commands.add_parser("tester", help="exercise the printer connection")
+    tester.add_argument("--port", help="printer port instead of searching for one")
+    tester.add_argument("--stream", metavar="FILE", help="stream a G-code file, - for stdin")
+    tester.add_argument("--depth", type=int, default=4, help="firmware BUFSIZE (command slots)")
+    tester.add_argument("--rx-buffer", type=int, default=128, help="firmware RX_BUFFER_SIZE (bytes)")
+    tester.set_defaults(run=run_tester)
+
+    probe = commands.add_parser("probe", help="show the firmware and the current probe Z-offset")
+    probe.add_argument("--port", help="printer port instead of searching for one")
+    probe.add_argument("--baud", type=int, help="fixed baud rate instead of detecting it")
+    probe.set_defaults(run=run_probe)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    # returns the exit status
+    args = parse_args(argv)
+    return args.run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+# Flow-controlled command queue.
+# Marlin handles commands strictly in order and answers each one with an "ok"
+# once it has been taken out of its serial command buffer.  The queue keeps
+# no more commands (and characters) in flight than that buffer can hold and
+# resolves each command's future when its own "ok" arrives, so callers get
+# synchronous behaviour without padding no-ops or sleeps.
+
+import collections
+import concurrent.futures
+import threading
+import time
+
+from .serial_reader import OK, FIRMWARE, PROBE_OFFSET, OTHER, WAKEUP_INTERVAL
+
+MARLIN_BUFSIZE = 4  # default BUFSIZE (serial command buffer slots)
+MARLIN_RX_BUFFER_SIZE = 128  # default RX_BUFFER_SIZE (bytes)
+
+# response lines that belong to the command currently being answered
+RESPONSE_LINE_KINDS = (FIRMWARE, PROBE_OFFSET, OTHER)
+
+
+def encode_command(text):
+    return (text + " \r\n").encode("Ascii")
+
+
+class Command:
+    def __init__(self, text):
+        self.text = text
+        self.data = encode_command(text)
+        self.responses = []
+        self.future = concurrent.futures.Future()
+        self.queued_at = time.monotonic()
+        self.written_at = None
+        self.acked_at = None
+        self.attempts = 0  # times written, more than one after a resend
+
+
+class CommandQueue:
+    def __init__(self, port, reader, depth=MARLIN_BUFSIZE, rx_buffer=MARLIN_RX_BUFFER_SIZE):
+        self.port = port
+        self.reader = reader
+        self.depth = depth
+        self.rx_buffer = rx_buffer
+        self.pending = collections.deque()  # queued, not written yet
+        self.in_flight = collections.deque()  # written, waiting for "ok"
+        self.in_flight_chars = 0
+        self.tracer = None  # optional CommandTracer
+        self.lock = threading.Lock()
+        reader.route(OK, self.on_ok)
+        for kind in RESPONSE_LINE_KINDS:
+            reader.route(kind, self.make_response_handler(kind))
+
+    def send(self, text):
+        # queues a command, returns a future resolved with its response lines
+        return self.submit(self.make_command(text))
+
+    def make_command(self, text):
+        return Command(text)
+
+    def submit(self, command):
+        with self.lock:
+            self.pending.append(command)
+            self.pump()
+        return command.future
+
+    def wait(self, future, timeout=None):
+        # like future.result() but stays interruptible and notices a dead reader
+        if timeout is not None:
+            return future.result(timeout=timeout)
+        while True:
+            try:
+                return future.result(timeout=WAKEUP_INTERVAL)
+            except concurrent.futures.TimeoutError:
+                if not self.reader.running:
+                    raise EOFError("serial reader stopped")
+
+    def cancel(self, futures):
+        # withdraws commands that have not been written yet, all of them or none,
+        # returns True when they were withdrawn
+        with self.lock:
+            waiting = [command for command in self.pending if command.future in futures]
+            if len(waiting) != len(futures):
+                return False  # at least one is with the firmware already
+            for command in waiting:
+                self.pending.remove(command)
+        for command in waiting:
+            command.future.cancel()
+        return True
+
+    def pump(self):
+        # lock must be held; write as many pending commands as the firmware can buffer
+        while self.pending and len(self.in_flight) < self.depth:
+            command = self.pending[0]
+            if self.in_flight and self.in_flight_chars + len(command.data) > self.rx_buffer:
+                break
+            self.pending.popleft()
+            if command.attempts == 0 and not command.future.set_running_or_notify_cancel():
+                continue  # cancelled before it was sent
+            command.attempts += 1
+            self.in_flight.append(command)
+            self.in_flight_chars += len(command.data)
+            self.port.write(command.data)
+            command.written_at = time.monotonic()
+            if self.tracer is not None:
+                self.tracer.command_written(command)
+
+    def on_ok(self, line):
+        with self.lock:
+            if not self.in_flight:
+                # not ours (e.g. sent before the queue existed)
+                self.reader.drop(line)
+                return
+            command = self.in_flight.popleft()
+            command.acked_at = time.monotonic()
+            self.in_flight_chars -= len(command.data)
+            self.pump()
+        if self.tracer is not None:
+            self.tracer.command_acknowledged(command, line)
+        if line != "ok":  # e.g. "ok T:..." from M105
+            command.responses.append(line)
+        command.future.set_result(command.responses)
+
+    def make_response_handler(self, kind):
+        def on_response(line):
+            with self.lock:
+                command = self.in_flight[0] if self.in_flight else None
+            if command is None:
+                self.reader.drop(line)  # unsolicited, e.g. boot messages
+            else:
+                command.responses.append(line)
+        return on_response
@@ -0,0 +1,104 @@
+# Opt-in per-command latency tracing.
+# The command queue and serial reader report every command queued, written
+# and acknowledged and every line read.  The tracer pairs each command with
+# its "ok", keeps a latency histogram per command word (G0, G28, M500, ...)
+# and streams all events as JSON lines so traces can be loaded into
+# dashboards.  The last lines of a trace hold the histograms.
+
+import json
+import threading
+import time
+
+HISTOGRAM_BUCKETS = 20  # bucket i holds latencies below 2**i ms, the last one everything above
+
+
+def command_word(text):
+    return text.split(maxsplit=1)[0].upper() if text.strip() else ""
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * HISTOGRAM_BUCKETS
+
+    def add(self, seconds):
+        ms = seconds * 1000
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+        self.buckets[min(int(ms).bit_length(), HISTOGRAM_BUCKETS - 1)] += 1
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, fraction):
+        # upper bound (ms) of the bucket holding the given fraction of samples
+        wanted = fraction * self.count
+        seen = 0
+        for index, bucket in enumerate(self.buckets):
+            seen += bucket
+            if seen >= wanted:
+                return float(2 ** index)
+        return self.max
+
+    def as_dict(self):
+        return {"count": self.count, "mean_ms": round(self.mean(), 3), "max_ms": round(self.max, 3),
+                "buckets_ms": {str(2 ** index): bucket for index, bucket in enumerate(self.buckets) if bucket}}
+
+
+class CommandTracer:
+    def __init__(self, path):
+        self.path = path
+        self.trace_file = open(path, "w")
+        self.started = time.monotonic()
+        self.phase = ""
+        self.histograms = {}
+        self.queue_waits = LatencyHistogram()  # time commands spent waiting for buffer space
+        self.lock = threading.Lock()
+
+    def emit(self, event, **fields):
+        fields["t"] = round(time.monotonic() - self.started, 6)
+        fields["event"] = event
+        fields["phase"] = self.phase
+        with self.lock:
+            if self.trace_file is not None:
+                self.trace_file.write(json.dumps(fields) + "\n")
+
+    def start_phase(self, name):
+        self.phase = name
+        self.emit("phase")
+
+    def command_written(self, command):
+        self.emit("write", cmd=command.text, wait_ms=round((command.written_at - command.queued_at) * 1000, 3))
+
+    def command_acknowledged(self, command, line):
+        latency = command.acked_at - command.written_at
+        word = command_word(command.text)
+        with self.lock:
+            histogram = self.histograms.get(word)
+            if histogram is None:
+                histogram = self.histograms[word] = LatencyHistogram()
+            histogram.add(latency)
+            self.queue_waits.add(command.written_at - command.queued_at)
+        self.emit("ok", cmd=command.text, word=word, latency_ms=round(latency * 1000, 3), line=line)
+
+    def line_read(self, line, kind):
+        self.emit("read", kind=kind, line=line)
+
+    def close(self):
+        for word, histogram in sorted(self.histograms.items()):
+            self.emit("histogram", word=word, **histogram.as_dict())
+        self.emit("histogram", word="(buffer wait)", **self.queue_waits.as_dict())
+        with self.lock:
+            self.trace_file.close()
+            self.trace_file = None
+
+    def print_summary(self):
+        print("Command latency (ms):")
+        print("\t{0:<8}{1:>7}{2:>10}{3:>10}{4:>10}".format("command", "count", "mean", "p90 <", "max"))
+        for word, histogram in sorted(self.histograms.items(), key=lambda item: -item[1].total):
+            print("\t{0:<8}{1:>7}{2:>10.1f}{3:>10.0f}{4:>10.1f}".format(
+                word, histogram.count, histogram.mean(), histogram.percentile(0.9), histogram.max))
+        print("Trace written to " + self.path)
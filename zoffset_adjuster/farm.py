@@ -0,0 +1,217 @@
+# Asyncio calibration engine for a printer farm.
+# One event loop drives every printer listed under "printers" in
+# config.json.  Each printer gets its own ZOffsetAdjuster (state, serial
+# reader and command queue) built from its own config section.  Connecting,
+# heat-up and setup overlap across all machines; the operator is handed the
+# printers one at a time, in the order they become ready for the paper test.
+# With a batch script there is no operator and every printer runs its test
+# as soon as it is ready.  A printer that fails (unplugged, no answer) is
+# made safe as far as it still listens and the others carry on.
+#
+#   python -m zoffset_adjuster.farm [--batch SCRIPT | --batch-file PATH]
+
+import argparse
+import asyncio
+import copy
+import json
+
+import serial
+
+from .adjuster import ZOffsetAdjuster
+from .batch_script import load_batch_script
+from .printer_settings import BED_TARGET, ENDSTOPS, HOTEND_TARGET
+from .serial_reader import WAKEUP_INTERVAL
+
+HEAT_POLL_INTERVAL = 1  # seconds between heater checks
+SHUT_DOWN_TIMEOUT = 5  # seconds a failed printer gets to acknowledge each shut down command
+FAILURES = (OSError, serial.SerialException, ValueError, EOFError)  # one printer fails, the farm carries on
+
+
+def load_farm_config(path="config.json"):
+    # every entry under "printers" overrides the top level settings for one printer
+    with open(path, "r") as cfg:
+        config = json.load(cfg)
+    defaults = copy.deepcopy(config)
+    defaults.pop("printers", None)
+    sections = []
+    for printer in config.get("printers", []):
+        section = copy.deepcopy(defaults)
+        for key, value in printer.items():
+            if isinstance(value, dict):
+                section.setdefault(key, {}).update(value)
+            else:
+                section[key] = value
+        sections.append(section)
+    return sections
+
+
+class PrinterSession:
+    def __init__(self, section, script=None):
+        self.adjuster = ZOffsetAdjuster()
+        self.adjuster.apply_config(section)
+        if script is not None:
+            script.apply(self.adjuster)
+        self.name = section.get("name", self.adjuster.PRINTER_PORT)
+
+    def log(self, msg):
+        print("[" + self.name + "] " + msg)
+
+    async def command(self, cmd):
+        # resolves when the printer acknowledges the command, with its response lines,
+        # raises EOFError when the printer goes away first
+        future = asyncio.wrap_future(self.adjuster.send_printer_cmd(cmd))
+        while True:
+            try:
+                return await asyncio.wait_for(asyncio.shield(future), WAKEUP_INTERVAL)
+            except asyncio.TimeoutError:
+                if not self.adjuster.READER.running:
+                    raise EOFError("serial reader stopped")
+
+    async def move(self, cmd):
+        await self.command(cmd)
+        await self.command("M400")  # acknowledged once the move has finished
+
+    async def connect(self):
+        adjuster = self.adjuster
+        if adjuster.PRINTER_PORT == "":
+            raise ValueError("printer " + self.name + " has no port in config file")
+        # opening the port can stall while the board resets, keep it off the loop
+        await asyncio.get_running_loop().run_in_executor(None, adjuster.open_port)
+        adjuster.start_reader()
+        adjuster.read_firmware_report(await self.command("M115"))
+        self.log("connected on " + adjuster.PRINTER_PORT + ": " +
+                 adjuster.MACHINE_FIRMWARE_NAME + " " + adjuster.MACHINE_FIRMWARE_VERSION)
+
+    async def start_heating(self):
+        adjuster = self.adjuster
+        adjuster.start_monitor()
+        await self.command("M155 S" + str(adjuster.TELEMETRY_INTERVAL))  # temp reporting stays on for telemetry
+        await self.command(adjuster.SETTINGS.change(BED_TARGET, float(adjuster.BED_TEMP)))
+        await self.command(adjuster.SETTINGS.change(HOTEND_TARGET, float(adjuster.EXTRUDER_TEMP)))
+
+    async def setup(self):
+        adjuster = self.adjuster
+        adjuster.read_probe_offset_report(await self.command("M851"))
+        self.log("current Z-offset " + adjuster.CURRENT_Z_OFFSET)
+        adjuster.recall_calibration()
+        for cmd, msg, is_move in adjuster.setup_commands():
+            self.log(msg + "...")
+            if is_move:
+                await self.move(cmd)
+            else:
+                await self.command(cmd)
+
+    async def wait_for_heat(self):
+        monitor = self.adjuster.MONITOR
+        while not monitor.ready():
+            if not self.adjuster.READER.running:
+                raise EOFError("printer disconnected while heating")
+            await asyncio.sleep(HEAT_POLL_INTERVAL)
+        monitor.stop()
+        self.log("heaters ready: " + monitor.status())
+
+    async def prepare(self, ready):
+        # everything up to the paper test, then queue the printer for the operator
+        # a printer that fails is queued as None so the operator does not wait for it
+        try:
+            await self.connect()
+            await self.start_heating()
+            await self.setup()
+            await self.wait_for_heat()
+        except FAILURES as e:
+            self.log("failed: " + str(e))
+            await self.shut_down()
+            await ready.put(None)
+            return
+        self.log("ready for paper test")
+        await ready.put(self)
+
+    async def shut_down(self):
+        # after a failure: heaters off, endstops on and the Z-offset put back, as far as
+        # the printer still answers, then the port and the reader are closed
+        adjuster = self.adjuster
+        if adjuster.SETTINGS is not None:
+            commands = [adjuster.SETTINGS.change(BED_TARGET, 0), adjuster.SETTINGS.change(HOTEND_TARGET, 0),
+                        adjuster.SETTINGS.change(ENDSTOPS, True)] + adjuster.SETTINGS.rollback()
+            for cmd in commands:
+                if cmd is None:
+                    continue
+                try:
+                    await asyncio.wait_for(self.command(cmd), SHUT_DOWN_TIMEOUT)
+                except FAILURES + (asyncio.TimeoutError,):
+                    self.log("could not send " + cmd)
+        adjuster.close_printer()
+
+
+async def paper_test(session):
+    # blocking console work runs in a thread, returns the exit status, None when the printer failed
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(None, session.adjuster.paper_test)
+        status = await loop.run_in_executor(None, session.adjuster.finish_session)
+    except FAILURES as e:
+        session.log("failed: " + str(e))
+        await session.shut_down()
+        return None
+    session.adjuster.store_calibration()
+    session.adjuster.close_printer()
+    return status
+
+
+async def unattended(session):
+    ready = asyncio.Queue()
+    await session.prepare(ready)
+    if await ready.get() is None:
+        return None
+    return await paper_test(session)
+
+
+async def operator(ready, count):
+    # hands the operator one ready printer at a time
+    results = {}
+    for i in range(count):
+        session = await ready.get()
+        if session is None:
+            continue
+        print("\n===== Paper test on " + session.name + " =====")
+        status = await paper_test(session)
+        if status is not None:
+            results[session.name] = status
+    return results
+
+
+async def run_farm(sections, script=None):
+    sessions = [PrinterSession(section, script) for section in sections]
+    if script is not None:
+        # each printer's own errors are handled in its task, anything else must not stop the others
+        statuses = await asyncio.gather(*[unattended(session) for session in sessions], return_exceptions=True)
+        results = {}
+        for session, status in zip(sessions, statuses):
+            if isinstance(status, Exception):
+                session.log("failed: " + repr(status))
+            elif status is not None:
+                results[session.name] = status
+        return results
+    ready = asyncio.Queue()
+    preparing = [session.prepare(ready) for session in sessions]
+    results = await asyncio.gather(operator(ready, len(sessions)), *preparing, return_exceptions=True)
+    for session, result in zip(sessions, results[1:]):
+        if isinstance(result, Exception):
+            session.log("failed: " + repr(result))
+    if isinstance(results[0], Exception):
+        raise results[0]
+    return results[0]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calibrate every printer in the config file.")
+    parser.add_argument("--batch", metavar="SCRIPT", help="run unattended with this batch script")
+    parser.add_argument("--batch-file", metavar="PATH", help="read the batch script from a file, - for stdin")
+    args = parser.parse_args()
+    farm_sections = load_farm_config()
+    if not farm_sections:
+        print("no printers listed under \"printers\" in config file.  Exiting.")
+        exit(1)
+    farm_results = asyncio.run(run_farm(farm_sections, load_batch_script(args.batch, args.batch_file)))
+    for printer_name, printer_status in farm_results.items():
+        print(printer_name + ": " + ("saved" if printer_status == 0 else "aborted"))
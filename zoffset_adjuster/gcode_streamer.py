@@ -0,0 +1,125 @@
+# Streaming G-code sender.
+# Sends a whole file (or stdin) as fast as the firmware takes it: lines are
+# numbered and checksummed, and the command queue keeps the firmware's
+# serial buffer as full as its slot count and RX_BUFFER_SIZE allow, instead
+# of waiting for each "ok" before sending the next line.
+#
+# A line the firmware rejects ("Resend: N") is sent again together with
+# everything that followed it.  Marlin clears its serial buffer when it
+# rejects a line, so the lines after it never get an "ok"; they are taken
+# out of the window straight away.  Lines that were still on the wire are
+# rejected one by one as they arrive, each clearing the buffer again, so
+# nothing is resent until the firmware has stopped asking for a while.
+
+import collections
+import threading
+import time
+
+from .command_queue import Command, CommandQueue, MARLIN_BUFSIZE, MARLIN_RX_BUFFER_SIZE
+from .serial_reader import RESEND
+
+MAX_PENDING = 64  # lines read ahead of the firmware, bounds memory when streaming big files
+RESEND_SETTLE = 0.05  # seconds without a new resend request before the rejected lines go out again
+
+
+def checksum(line):
+    # Marlin's checksum: XOR of every character before the "*"
+    result = 0
+    for byte in line.encode("Ascii"):
+        result ^= byte
+    return result
+
+
+def number_line(number, text):
+    line = "N{0} {1}".format(number, text)
+    return "{0}*{1}".format(line, checksum(line))
+
+
+def gcode_lines(source):
+    # the commands in a G-code file, without comments and blank lines
+    for line in source:
+        text = line.split(";", 1)[0].strip()
+        if text:
+            yield text
+
+
+class StreamingQueue(CommandQueue):
+    def __init__(self, port, reader, depth=MARLIN_BUFSIZE, rx_buffer=MARLIN_RX_BUFFER_SIZE):
+        super().__init__(port, reader, depth, rx_buffer)
+        self.line_number = 0
+        self.space = threading.Condition(self.lock)  # signalled whenever a line is acknowledged
+        self.source_done = False
+        self.resends = 0
+        self.underruns = 0  # times the firmware ran out of lines before the stream ended
+        self.rejection_oks = 0  # "ok"s still to come for rejected lines, they acknowledge no command
+        self.holding = False  # no writes while the firmware may still be rejecting lines
+        self.resume_timer = None
+        reader.route(RESEND, self.on_resend)
+
+    def make_command(self, text):
+        # lock not held: only the streaming thread queues commands
+        self.line_number += 1
+        command = Command(number_line(self.line_number, text))
+        command.number = self.line_number
+        return command
+
+    def pump(self):
+        if not self.holding:
+            super().pump()
+
+    def on_ok(self, line):
+        with self.lock:
+            if self.rejection_oks:
+                self.rejection_oks -= 1
+                return
+        super().on_ok(line)
+        with self.space:
+            if not self.in_flight and not self.pending and not self.source_done:
+                self.underruns += 1
+            self.space.notify_all()
+
+    def on_resend(self, line):
+        # the firmware follows every resend request with one "ok" of its own
+        number = int(line.split(":" if ":" in line else " ")[1].split()[0])
+        with self.lock:
+            self.rejection_oks += 1
+            # lines before number were accepted and still get their "ok", the rest never will
+            accepted = [command for command in self.in_flight
+                        if getattr(command, "number", None) is None or command.number < number]
+            dropped = [command for command in self.in_flight if command not in accepted]
+            if dropped:
+                self.resends += 1
+                self.in_flight = collections.deque(accepted)
+                self.in_flight_chars = sum(len(command.data) for command in accepted)
+                for command in dropped:
+                    command.responses = []
+                self.pending.extendleft(reversed(dropped))
+            self.holding = True
+            if self.resume_timer is not None:
+                self.resume_timer.cancel()
+            self.resume_timer = threading.Timer(RESEND_SETTLE, self.resume)
+            self.resume_timer.daemon = True
+            self.resume_timer.start()
+
+    def resume(self):
+        with self.lock:
+            self.holding = False
+            self.resume_timer = None
+            self.pump()
+
+    def stream(self, lines):
+        # sends every line, returns (lines sent, seconds) once the last one is acknowledged
+        self.wait(self.submit(Command("M110 N0")))  # unnumbered, restarts the firmware's line numbering
+        started = time.monotonic()
+        last = None
+        count = 0
+        for text in lines:
+            with self.space:
+                self.space.wait_for(lambda: len(self.pending) < MAX_PENDING)
+            last = self.send(text)
+            count += 1
+        with self.lock:
+            self.source_done = True
+        if last is not None:
+            self.wait(last)
+        return count, time.monotonic() - started
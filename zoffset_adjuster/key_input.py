@@ -0,0 +1,32 @@
+# Key event sources for the interactive offset test.
+# ConsoleKeys reads the console through the keyboard module (imported only
+# when first used, it needs root on Linux).  ScriptedKeys replays a fixed
+# list of key names so a session can run without anyone at the console.
+
+KEY_DOWN = "down"  # same value as keyboard.KEY_DOWN
+
+
+class KeyEvent:
+    # the parts of keyboard.KeyboardEvent the adjuster looks at
+    def __init__(self, name, event_type=KEY_DOWN):
+        self.name = name
+        self.event_type = event_type
+
+
+class ConsoleKeys:
+    def read_event(self, suppress=False):
+        import keyboard
+        return keyboard.read_event(suppress=suppress)
+
+
+class ScriptedKeys:
+    def __init__(self, names):
+        self.names = list(names)
+        self.position = 0
+
+    def read_event(self, suppress=False):
+        if self.position >= len(self.names):
+            raise EOFError("key script exhausted")
+        name = self.names[self.position]
+        self.position += 1
+        return KeyEvent(name)
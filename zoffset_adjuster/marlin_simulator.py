@@ -0,0 +1,384 @@
+# Simulated Marlin printer on a pseudo-terminal (POSIX only).
+# Stands in for a real printer in tests and benchmarks: open the pty path
+# it prints with pyserial exactly like a COM port.  It answers the commands
+# ZOffsetAdjuster uses with Marlin 1.1.9 or 2.0.7.2 style responses, heats
+# the bed (bang-bang) and hotend (PID-like) along simple thermal curves,
+# takes time to home and move, and sends "echo:busy" while it is blocked.
+# Numbered lines are checked like Marlin does and error_rate rejects a
+# share of them at random so resend handling can be exercised.
+# All durations are divided by speed so sessions can run faster than life.
+#
+#   python -m zoffset_adjuster.marlin_simulator [--firmware 1.1.9] [--speed 10]
+
+import argparse
+import os
+import pty
+import queue
+import random
+import threading
+import time
+import tty
+
+FIRMWARE_VERSIONS = ("1.1.9", "2.0.7.2")
+AMBIENT_TEMP = 22.0
+BUSY_INTERVAL = 2.0  # Marlin's default DEFAULT_KEEPALIVE_INTERVAL
+THERMAL_STEP = 0.1  # simulated seconds per integration step
+MAX_POWER = 127
+HOLD_MARGIN = 1.02  # a little extra holding power so the hotend settles just above target
+BED_CHECK_INTERVAL = 5.0  # Marlin only switches a bang-bang bed every 5 seconds, it swings around the target
+
+
+def number(text):
+    # like Marlin's parser, a malformed number reads as zero
+    try:
+        return float(text)
+    except ValueError:
+        return 0.0
+
+
+class SimulatedHeater:
+    def __init__(self, heat_rate, loss, bang_bang):
+        self.heat_rate = heat_rate  # deg/s at full power
+        self.loss = loss  # fraction of the difference to ambient lost per second
+        self.bang_bang = bang_bang
+        self.temp = AMBIENT_TEMP
+        self.target = 0.0
+        self.power = 0.0  # 0..1
+        self.next_check = 0.0  # simulated seconds until a bang-bang heater is switched again
+
+    def step(self, dt):
+        if self.target <= 0:
+            self.power = 0.0
+        elif self.bang_bang:
+            self.next_check -= dt
+            if self.next_check <= 0:
+                self.power = 1.0 if self.temp < self.target else 0.0
+                self.next_check = BED_CHECK_INTERVAL
+        else:
+            hold = HOLD_MARGIN * (self.target - AMBIENT_TEMP) * self.loss / self.heat_rate
+            self.power = min(1.0, max(0.0, (self.target - self.temp) / 2.0 + hold))
+        self.temp += (self.power * self.heat_rate - (self.temp - AMBIENT_TEMP) * self.loss) * dt
+
+    def report(self, letter):
+        return "{0}:{1:.2f} /{2:.2f}".format(letter, self.temp, self.target)
+
+    def power_report(self):
+        return int(round(self.power * MAX_POWER))
+
+
+class MarlinSimulator:
+    def __init__(self, firmware="2.0.7.2", speed=1.0, home_time=6.0, eeprom_time=0.05,
+                 z_offset=-2.5, uuid="cede2a2f-41a2-4748-9b12-c55c62f367ff", error_rate=0.0, seed=None):
+        if firmware not in FIRMWARE_VERSIONS:
+            raise ValueError("unsupported firmware version " + firmware)
+        self.firmware = firmware
+        self.speed = speed
+        self.home_time = home_time
+        self.eeprom_time = eeprom_time
+        self.uuid = uuid
+        self.z_offset = z_offset
+        self.eeprom_z_offset = z_offset
+        self.endstops = True
+        self.relative = False
+        self.position = {"X": 0.0, "Y": 0.0, "Z": 0.0}
+        self.feed_rate = 3000.0  # mm/min
+        self.motion_done_at = 0.0
+        self.hotend = SimulatedHeater(heat_rate=4.0, loss=0.01, bang_bang=False)
+        self.bed = SimulatedHeater(heat_rate=0.8, loss=0.008, bang_bang=True)
+        self.thermal_time = None
+        self.report_interval = 0
+        self.next_report = None
+        self.received = []  # every command line, for tests
+        self.last_line = 0  # last accepted line number (N)
+        self.error_rate = error_rate  # share of numbered lines rejected as corrupted
+        self.random = random.Random(seed)
+        self.commands = queue.Queue()
+        self.write_lock = threading.Lock()
+        self.thermal_lock = threading.Lock()
+        self.running = False
+        self.master = None
+        self.slave = None
+        self.port_name = None
+
+    def start(self):
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)
+        self.port_name = os.ttyname(self.slave)
+        self.running = True
+        self.thermal_time = time.monotonic()
+        for target in (self.receive_loop, self.command_loop, self.report_loop):
+            threading.Thread(target=target, daemon=True).start()
+        return self.port_name
+
+    def stop(self):
+        self.running = False
+        self.commands.put(None)
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    # --- timing ---
+
+    def sleep(self, seconds):
+        time.sleep(seconds / self.speed)
+
+    def wait_until(self, deadline):
+        # blocks until the simulated deadline, sending keepalives like Marlin does
+        while self.running:
+            remaining = (deadline - time.monotonic()) * self.speed
+            if remaining <= 0:
+                return
+            self.sleep(min(remaining, BUSY_INTERVAL))
+            if (deadline - time.monotonic()) > 0:
+                self.send("echo:busy: processing")
+
+    def update_thermals(self):
+        with self.thermal_lock:
+            now = time.monotonic()
+            elapsed = (now - self.thermal_time) * self.speed
+            self.thermal_time = now
+            while elapsed > 0:
+                dt = min(THERMAL_STEP, elapsed)
+                self.hotend.step(dt)
+                self.bed.step(dt)
+                elapsed -= dt
+
+    # --- serial side ---
+
+    def send(self, line):
+        with self.write_lock:
+            try:
+                os.write(self.master, (line + "\n").encode("Ascii"))
+            except OSError:
+                self.running = False
+
+    def receive_loop(self):
+        buffer = b""
+        while self.running:
+            try:
+                data = os.read(self.master, 1024)
+            except OSError:
+                break
+            buffer += data
+            while True:
+                end = min([i for i in (buffer.find(b"\n"), buffer.find(b"\r")) if i >= 0], default=-1)
+                if end < 0:
+                    break
+                line = buffer[:end].decode("Ascii", errors="replace").strip()
+                buffer = buffer[end + 1:]
+                if line:
+                    self.commands.put(line)
+
+    def report_loop(self):
+        while self.running:
+            time.sleep(0.05)
+            if self.report_interval <= 0:
+                continue
+            now = time.monotonic()
+            if now >= self.next_report:
+                self.next_report = now + self.report_interval / self.speed
+                self.send(" " + self.temperature_report())
+
+    def temperature_report(self):
+        self.update_thermals()
+        return "{0} {1} @:{2} B@:{3}".format(
+            self.hotend.report("T"), self.bed.report("B"),
+            self.hotend.power_report(), self.bed.power_report())
+
+    # --- command processing ---
+
+    def command_loop(self):
+        while self.running:
+            line = self.commands.get()
+            if line is None:
+                break
+            line = self.check_line(line)
+            if line is None:
+                continue
+            self.received.append(line)
+            words = line.split()
+            code = words[0].upper()
+            params = {}
+            for word in words[1:]:
+                params[word[0].upper()] = word[1:]
+            handler = getattr(self, "do_" + code, None)
+            acknowledged = False
+            if handler is None:
+                self.send("echo:Unknown command: \"" + line + "\"")
+            else:
+                acknowledged = handler(params)
+            if not acknowledged:
+                self.send("ok")
+
+    def check_line(self, line):
+        # strips the line number and checksum, None when the line was rejected
+        if not line.startswith("N"):
+            return line
+        body, star, sent_checksum = line.rpartition("*")
+        if not star:
+            return self.reject("No Checksum with line number")
+        checksum = 0
+        for byte in body.encode("Ascii"):
+            checksum ^= byte
+        if str(checksum) != sent_checksum.strip() or self.random.random() < self.error_rate:
+            return self.reject("checksum mismatch")
+        line_number, space, command = body.partition(" ")
+        command = command.strip()
+        if not command.upper().startswith("M110") and line_number[1:] != str(self.last_line + 1):
+            return self.reject("Line Number is not Last Line Number+1")
+        self.last_line = int(line_number[1:])
+        return command
+
+    def reject(self, reason):
+        # like Marlin's flush_and_request_resend: the lines already received are
+        # thrown away unanswered, one "ok" goes with the resend request
+        self.flush_received()
+        self.send("Error:" + reason + ", Last Line: " + str(self.last_line))
+        self.send("Resend: " + str(self.last_line + 1))
+        self.send("ok")
+        return None
+
+    def flush_received(self):
+        while True:
+            try:
+                line = self.commands.get_nowait()
+            except queue.Empty:
+                return
+            if line is None:
+                self.commands.put(None)  # stop() is waiting for the command loop
+                return
+
+    def do_M110(self, params):
+        self.last_line = int(number(params.get("N", 0)))
+
+    def do_M31(self, params):
+        self.send("echo:Print time: 0s")
+
+    def do_M115(self, params):
+        self.send("FIRMWARE_NAME:Marlin " + self.firmware + " (Simulated) "
+                  "SOURCE_CODE_URL:github.com/MarlinFirmware/Marlin PROTOCOL_VERSION:1.0 "
+                  "MACHINE_TYPE:Simulator EXTRUDER_COUNT:1 UUID:" + self.uuid)
+        self.send("Cap:AUTOREPORT_TEMP:1")
+        self.send("Cap:EEPROM:1")
+
+    def do_M105(self, params):
+        # Marlin puts the report on the "ok" line
+        self.send("ok " + self.temperature_report())
+        return True
+
+    def do_M155(self, params):
+        self.report_interval = number(params.get("S", 0))
+        self.next_report = time.monotonic()
+
+    def do_M140(self, params):
+        self.update_thermals()
+        self.bed.target = number(params.get("S", 0))
+
+    def do_M104(self, params):
+        self.update_thermals()
+        self.hotend.target = number(params.get("S", 0))
+
+    def wait_for_heater(self, heater):
+        while self.running:
+            self.update_thermals()
+            if heater.temp >= heater.target - 1:
+                return
+            self.send(" " + self.temperature_report() + " W:?")
+            self.sleep(1)
+
+    def do_M109(self, params):
+        self.do_M104(params)
+        if self.hotend.target > 0:
+            self.wait_for_heater(self.hotend)
+
+    def do_M190(self, params):
+        self.do_M140(params)
+        if self.bed.target > 0:
+            self.wait_for_heater(self.bed)
+
+    def do_M211(self, params):
+        if "S" in params:
+            self.endstops = params["S"] == "1"
+        self.send("echo:Soft endstops: " + ("On" if self.endstops else "Off") +
+                  "  Min:  X0.00 Y0.00 Z0.00   Max:  X220.00 Y220.00 Z250.00")
+
+    def do_M851(self, params):
+        if "Z" in params:
+            self.z_offset = number(params["Z"])
+            return
+        if self.firmware == "1.1.9":
+            self.send("echo:Probe Z Offset: {0:.2f}".format(self.z_offset))
+        else:
+            self.send("echo:Probe Offset X-44.00 Y-10.00 Z{0:.2f}".format(self.z_offset))
+
+    def do_M500(self, params):
+        self.sleep(self.eeprom_time)
+        self.eeprom_z_offset = self.z_offset
+        self.send("echo:Settings Stored (620 bytes; crc 31611)")
+
+    def do_M501(self, params):
+        self.z_offset = self.eeprom_z_offset
+        self.send("echo:V81 stored settings retrieved (620 bytes; crc 31611)")
+
+    def do_M400(self, params):
+        self.wait_until(self.motion_done_at)
+
+    def do_G4(self, params):
+        seconds = number(params.get("S", 0)) + number(params.get("P", 0)) / 1000
+        self.wait_until(max(time.monotonic(), self.motion_done_at) + seconds / self.speed)
+
+    def do_G28(self, params):
+        self.wait_until(max(time.monotonic(), self.motion_done_at) + self.home_time / self.speed)
+        self.position = {"X": 0.0, "Y": 0.0, "Z": 0.0}
+
+    def do_G90(self, params):
+        self.relative = False
+
+    def do_G91(self, params):
+        self.relative = True
+
+    def do_G92(self, params):
+        for axis in self.position:
+            if axis in params:
+                self.position[axis] = number(params[axis])
+
+    def do_G0(self, params):
+        # queued in the planner: "ok" now, the move finishes later (see M400)
+        if "F" in params:
+            self.feed_rate = number(params["F"])
+        distance = 0.0
+        for axis in self.position:
+            if axis in params:
+                target = number(params[axis])
+                if self.relative:
+                    target += self.position[axis]
+                distance = max(distance, abs(target - self.position[axis]))
+                self.position[axis] = target
+        duration = distance / (self.feed_rate / 60) / self.speed
+        self.motion_done_at = max(time.monotonic(), self.motion_done_at) + duration
+
+    do_G1 = do_G0
+
+    def do_M114(self, params):
+        self.send("X:{0:.2f} Y:{1:.2f} Z:{2:.2f} E:0.00 Count X:0 Y:0 Z:0".format(
+            self.position["X"], self.position["Y"], self.position["Z"]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a simulated Marlin printer on a pseudo-terminal.")
+    parser.add_argument("--firmware", choices=FIRMWARE_VERSIONS, default="2.0.7.2")
+    parser.add_argument("--speed", type=float, default=1.0, help="time acceleration factor")
+    parser.add_argument("--home-time", type=float, default=6.0, help="seconds G28 takes")
+    parser.add_argument("--z-offset", type=float, default=-2.5, help="initial M851 Z value")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of numbered lines to reject")
+    args = parser.parse_args()
+    simulator = MarlinSimulator(args.firmware, args.speed, args.home_time, z_offset=args.z_offset,
+                                error_rate=args.error_rate)
+    print("Simulated Marlin " + args.firmware + " on " + simulator.start())
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        simulator.stop()
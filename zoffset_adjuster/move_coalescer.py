@@ -0,0 +1,69 @@
+# Coalesces test moves requested faster than the printer can make them.
+# Only one test move is with the printer at a time.  Offsets requested while
+# it runs replace each other and only the latest is sent once it finishes,
+# so five quick presses of "-" cost one extra move instead of five.  A move
+# whose commands are all still waiting in the command queue is withdrawn and
+# replaced straight away.
+
+import threading
+import time
+
+from .serial_reader import WAKEUP_INTERVAL
+
+
+class MoveCoalescer:
+    def __init__(self, commands, start_move, on_arrived=None, position=None):
+        # start_move(offset, from_offset) queues a move and returns its futures,
+        # the last one resolving when the move has finished (M400)
+        self.commands = commands
+        self.start_move = start_move
+        self.on_arrived = on_arrived  # on_arrived(offset, seconds) once the nozzle settles at the target
+        self.position = position  # offset the nozzle was last moved to, None if unknown
+        self.target = position
+        self.repeat = False  # move again even if already at the target
+        self.moving_to = None
+        self.futures = None  # commands of the move in flight
+        self.started = None
+        self.lock = threading.RLock()  # reentrant: a withdrawn move's callback runs in request()
+        self.settled = threading.Condition(self.lock)  # notified once no move is left in flight
+
+    def request(self, offset, repeat=False):
+        with self.lock:
+            self.target = offset
+            self.repeat = self.repeat or repeat
+            if self.futures is not None:
+                if not self.commands.cancel(self.futures):
+                    return  # already moving, the target is sent when the move finishes
+                self.futures = None  # withdrawn before the printer saw it
+            self.start()
+
+    def start(self):
+        # lock must be held
+        self.moving_to = self.target
+        self.repeat = False
+        self.started = time.monotonic()
+        self.futures = self.start_move(self.moving_to, self.position)
+        self.futures[-1].add_done_callback(self.arrived)
+
+    def arrived(self, future):
+        with self.lock:
+            if future.cancelled() or self.futures is None or future is not self.futures[-1]:
+                return  # withdrawn and replaced
+            self.position = self.moving_to
+            self.futures = None
+            if self.target != self.position or self.repeat:
+                self.start()  # superseded while moving
+                return
+            elapsed = time.monotonic() - self.started
+            # before wait() returns, so nothing its caller prints can come first
+            if self.on_arrived is not None:
+                self.on_arrived(self.position, elapsed)
+            self.settled.notify_all()
+
+    def wait(self):
+        # blocks until the nozzle is at the latest requested offset, returns it
+        with self.settled:
+            while self.futures is not None:
+                if not self.settled.wait(timeout=WAKEUP_INTERVAL) and not self.commands.reader.running:
+                    raise EOFError("serial reader stopped")
+            return self.position
@@ -0,0 +1,64 @@
+# Bisection search for the Z-offset.
+# The operator only says whether the paper drags too much ("too tight",
+# nozzle too low) or not at all ("too loose", nozzle too high) and the
+# bracket between the tightest loose offset and the loosest tight offset is
+# halved until it is one resolution step wide, about log2(range/0.01) moves.
+# Bracket ends that are only a guess are tested themselves once every
+# answer runs into them (one move), and only if that answer is outside the
+# bracket too is the end pushed outwards and the new end tested straight
+# away.
+
+
+class BisectionSearch:
+    def __init__(self, low, high, resolution=0.01):
+        # low is the lowest (most negative) offset, high the highest
+        self.resolution = resolution
+        self.steps = int(round((high - low) / resolution))
+        self.origin = low
+        self.low = 0  # bracket ends in resolution steps from origin
+        self.high = self.steps
+        self.low_confirmed = False  # set once an offset at low was answered "too tight"
+        self.high_confirmed = False  # set once an offset at high was answered "too loose"
+        self.beyond = False  # the last answer was outside the bracket, which has been widened
+        self.current = None
+        self.moves = 0
+
+    def offset(self, step):
+        return round(self.origin + step * self.resolution, 2)
+
+    def done(self):
+        return self.high - self.low <= 1 and self.low_confirmed and self.high_confirmed
+
+    def next_offset(self):
+        # an unconfirmed end is tested once the bracket has closed on it or been widened past it
+        probe_end = self.beyond or self.high - self.low <= 1
+        if probe_end and not self.high_confirmed:
+            self.current = self.high
+        elif probe_end and not self.low_confirmed:
+            self.current = self.low
+        else:
+            self.current = (self.low + self.high) // 2
+        self.moves += 1
+        return self.offset(self.current)
+
+    def too_tight(self):
+        # nozzle too low, the offset has to go up
+        self.low = self.current
+        self.low_confirmed = True
+        self.beyond = self.low >= self.high
+        if self.beyond:  # the guessed high end is too tight as well
+            self.high = self.low + self.steps
+            self.high_confirmed = False
+
+    def too_loose(self):
+        # nozzle too high, the offset has to come down
+        self.high = self.current
+        self.high_confirmed = True
+        self.beyond = self.high <= self.low
+        if self.beyond:  # the guessed low end is too loose as well
+            self.low = self.high - self.steps
+            self.low_confirmed = False
+
+    def result(self):
+        # the tightest offset that was not too tight
+        return self.offset(self.high)
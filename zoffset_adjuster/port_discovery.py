@@ -0,0 +1,144 @@
+# Serial port discovery.
+# Probes all candidate ports at once with a short M115 handshake and keeps
+# the first one that answers like Marlin.  Each port is tried at several
+# baud rates, fastest first, switching the rate on the open port so the
+# board is only reset once.  The winning port and baud rate are cached per
+# machine so the next run tries them first and skips the scan.
+
+import concurrent.futures
+import json
+import os
+import socket
+import threading
+import time
+
+import serial
+
+HANDSHAKE_TIMEOUT = 8  # most boards reset when the port opens, allow for the bootloader
+HANDSHAKE_INTERVAL = 0.5  # M115 is resent until the firmware answers
+RATE_WINDOW = 0.25  # time one baud rate gets to answer before the next is tried
+BAUD_RATES = (1000000, 500000, 250000, 230400, 115200)  # common Marlin BAUDRATE settings, fastest first
+SETTLE_TIMEOUT = 0.2  # quiet time that ends the rest of the M115 report
+PORT_CACHE_FILE = os.path.join(os.path.expanduser("~"), ".zoffset_adjuster_ports.json")
+
+
+def is_marlin_response(line):
+    return line.startswith(b"FIRMWARE_NAME:") and b"Marlin" in line
+
+
+def answers_m115(port, window):
+    # sends M115 and watches the replies for window seconds
+    port.write(b"M115 \r\n")
+    deadline = time.monotonic() + window
+    while time.monotonic() < deadline:
+        if is_marlin_response(port.readline()):
+            return True
+    return False
+
+
+def probe_port(device, baudrates, stop=None, timeout=HANDSHAKE_TIMEOUT):
+    # returns (open port, baud rate) if a Marlin printer answers M115 on it at one
+    # of the rates, the first rate that answers wins; (None, None) otherwise
+    window = HANDSHAKE_INTERVAL if len(baudrates) == 1 else RATE_WINDOW
+    try:
+        port = serial.Serial(device, baudrate=baudrates[0], timeout=window)
+    except (serial.SerialException, OSError):
+        return None, None
+    deadline = time.monotonic() + timeout
+    try:
+        # the rates are cycled until the board has finished booting and one of them answers
+        while time.monotonic() < deadline and not (stop is not None and stop.is_set()):
+            for baudrate in baudrates:
+                try:
+                    port.baudrate = baudrate  # no reopen, no board reset
+                except (ValueError, serial.SerialException):
+                    continue  # the driver cannot do this rate
+                port.reset_input_buffer()  # garbage from the previous rate
+                if answers_m115(port, window):
+                    # swallow the rest of the report(s) so the session starts clean
+                    port.timeout = SETTLE_TIMEOUT
+                    while port.readline():
+                        pass
+                    return port, baudrate
+    except (serial.SerialException, OSError):
+        pass
+    port.close()
+    return None, None
+
+
+def load_port_cache():
+    try:
+        with open(PORT_CACHE_FILE, "r") as cache_file:
+            return json.load(cache_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_port_cache(device, baudrate):
+    cache = load_port_cache()
+    cache[socket.gethostname()] = {"port": device, "baud": baudrate}
+    try:
+        with open(PORT_CACHE_FILE, "w") as cache_file:
+            json.dump(cache, cache_file, indent=4)
+    except OSError:
+        pass  # the cache is only an optimisation
+
+
+def candidate_rates(baudrates, preferred):
+    # baudrates with the cached rate tried first
+    if preferred in baudrates:
+        return (preferred,) + tuple(rate for rate in baudrates if rate != preferred)
+    return tuple(baudrates)
+
+
+def cached_port():
+    entry = load_port_cache().get(socket.gethostname())
+    if entry is None:
+        return None, None
+    return entry["port"], entry["baud"]
+
+
+def scan_ports(devices, baudrates):
+    # probes all devices in parallel, returns (port, device, baud rate) of the first printer found
+    stop = threading.Event()
+    found = None, None, None
+    if not devices:
+        return found
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(devices)) as pool:
+        probes = {pool.submit(probe_port, device, baudrates, stop): device for device in devices}
+        for probe in concurrent.futures.as_completed(probes):
+            port, baudrate = probe.result()
+            if port is None:
+                continue
+            if found[0] is None:
+                found = port, probes[probe], baudrate
+                stop.set()
+            else:
+                port.close()  # lost the race
+    return found
+
+
+def open_printer(device, baudrates):
+    # (port, baud rate) of the printer on a known device, trying its cached rate first
+    cached_device, cached_baud = cached_port()
+    if cached_device == device:
+        baudrates = candidate_rates(baudrates, cached_baud)
+    port, baudrate = probe_port(device, baudrates)
+    if port is not None:
+        save_port_cache(device, baudrate)
+    return port, baudrate
+
+
+def discover_printer(baudrates=BAUD_RATES):
+    # returns (port, device, baud rate) of a printer, or (None, None, None)
+    device, cached_baud = cached_port()
+    if device is not None and cached_baud in baudrates:
+        port, baudrate = probe_port(device, (cached_baud,))
+        if port is not None:
+            return port, device, baudrate
+    import serial.tools.list_ports as port_list  # slow to import, only a full scan needs it
+    devices = [p.device for p in port_list.comports()]
+    port, device, baudrate = scan_ports(devices, baudrates)
+    if port is not None:
+        save_port_cache(device, baudrate)
+    return port, device, baudrate
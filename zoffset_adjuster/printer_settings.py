@@ -0,0 +1,85 @@
+# Printer settings transaction.
+# A session changes a handful of printer settings: the software endstops,
+# the probe Z-offset and the heater targets.  PrinterSettings remembers what
+# the printer was last told (or reported), so a command that would not
+# change anything is never sent, and the settings kept in EEPROM are only
+# written once, by commit(), with a single M500.  Nothing is saved while
+# the session runs, so an abort only has to put back what changed.
+#
+# The methods return command text (or None when there is nothing to send)
+# rather than sending it, so the blocking adjuster and the asyncio farm
+# can both use them.
+
+ENDSTOPS = "endstops"
+PROBE_Z_OFFSET = "probe z-offset"
+BED_TARGET = "bed target"
+HOTEND_TARGET = "hotend target"
+
+# setting -> (command template, kept in EEPROM by M500)
+SETTINGS = {
+    ENDSTOPS: ("M211 S{0:d}", False),
+    PROBE_Z_OFFSET: ("M851 Z{0:.2f}", True),
+    BED_TARGET: ("M140 S{0:g}", False),
+    HOTEND_TARGET: ("M104 S{0:g}", False),
+}
+
+
+def setting_command(setting, value):
+    template, persistent = SETTINGS[setting]
+    if isinstance(value, float):
+        value = round(value, 2) + 0.0  # + 0.0 turns -0.0 into 0.0, no "Z-0.00"
+    return template.format(value)
+
+
+class PrinterSettings:
+    def __init__(self):
+        self.known = {}  # setting -> value the printer has now
+        self.saved = {}  # setting -> value in EEPROM, from the snapshot or the last commit
+        self.skipped = 0  # commands not sent because they changed nothing
+
+    def learn(self, setting, value):
+        # a value read back from the printer
+        self.known[setting] = value
+
+    def snapshot(self):
+        # the printer's current settings are what its EEPROM holds, abort goes back to them
+        self.saved = {setting: value for setting, value in self.known.items() if SETTINGS[setting][1]}
+
+    def change(self, setting, value):
+        # the command that sets value, None when the printer already has it
+        command = setting_command(setting, value)
+        if setting in self.known and setting_command(setting, self.known[setting]) == command:
+            self.skipped += 1
+            return None
+        self.known[setting] = value
+        return command
+
+    def unsaved(self):
+        # persistent settings whose value differs from what is in EEPROM
+        return [setting for setting, value in self.known.items() if SETTINGS[setting][1] and (
+            setting not in self.saved or
+            setting_command(setting, value) != setting_command(setting, self.saved[setting]))]
+
+    def commit(self):
+        # "M500" when anything needs saving, else None
+        unsaved = self.unsaved()
+        if not unsaved:
+            return None
+        for setting in unsaved:
+            self.saved[setting] = self.known[setting]
+        return "M500"
+
+    def rollback(self):
+        # commands that put the unsaved settings back to the snapshot; M501 reloads
+        # the EEPROM when a setting was changed before its value could be read
+        commands = []
+        reload = False
+        for setting in self.unsaved():
+            if setting in self.saved:
+                commands.append(self.change(setting, self.saved[setting]))
+            else:
+                del self.known[setting]
+                reload = True
+        if reload:
+            commands.append("M501")
+        return commands
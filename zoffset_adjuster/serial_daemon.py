@@ -0,0 +1,358 @@
+# Long-lived owner of the printer serial ports.
+# Opening a serial port resets most Marlin boards, so every run of the
+# adjuster or the tester used to wait for the bootloader and the M115
+# handshake.  The daemon opens each printer once, keeps reading it so its
+# output never backs up, and lends the connection to one client at a time
+# over a Unix socket.  A client that attaches gets an already initialised
+# printer in milliseconds.
+#
+# Before a client is attached the link is resynchronised: the daemon sends a
+# marker command (M118, echoed back as an unknown command by firmware
+# without it) and drops everything up to the "ok" after the marker, so the
+# "ok"s and reports the printer still owed the previous client never reach
+# the new one.
+#
+# Protocol: the client sends one JSON line, {"port": device or null for the
+# first printer found, "baud": rate or null to detect it}, and the daemon answers with one JSON
+# line, {"ok": true, "port": device, "baud": rate} or {"ok": false,
+# "error": text}.  After that the socket carries the raw serial traffic in
+# both directions until the client disconnects.  {"action": "status"} lists
+# the open ports instead.
+#
+#   python -m zoffset_adjuster.serial_daemon [--port DEVICE ...] [--baud RATE]  (rate detected when not given)
+#   python -m zoffset_adjuster.serial_daemon status
+
+import itertools
+import json
+import os
+import select
+import socket
+import sys
+import threading
+import time
+
+import serial
+
+from .port_discovery import BAUD_RATES, HANDSHAKE_TIMEOUT, discover_printer, open_printer
+
+SOCKET_FILE = os.path.join(os.path.expanduser("~"), ".zoffset_adjuster.sock")
+READ_TIMEOUT = 1  # how often an idle port read wakes up to notice shutdown
+SYNC_TIMEOUT = 10  # seconds the printer gets to finish the previous client's commands and answer the marker
+ATTACH_TIMEOUT = HANDSHAKE_TIMEOUT + SYNC_TIMEOUT + 5  # the daemon may have to open and handshake the port first
+
+
+def send_message(conn, message):
+    conn.sendall((json.dumps(message) + "\n").encode("Ascii"))
+
+
+def receive_message(conn):
+    # one JSON line, read a byte at a time so nothing after it is consumed
+    data = b""
+    while not data.endswith(b"\n"):
+        byte = conn.recv(1)
+        if not byte:
+            raise OSError("connection closed during handshake")
+        data += byte
+    return json.loads(data.decode("Ascii"))
+
+
+class PrinterLink:
+    # one serial port owned by the daemon, lent to at most one client
+    def __init__(self, device, baudrate, port):
+        self.device = device
+        self.baudrate = baudrate
+        self.port = port
+        self.port.timeout = READ_TIMEOUT
+        self.client = None
+        self.alive = True
+        self.lock = threading.Lock()
+        self.markers = itertools.count(1)
+        self.sync_marker = None  # bytes, set while a client waits for the link to be resynchronised
+        self.marker_seen = False
+        self.synced = threading.Event()
+        self.reader = threading.Thread(target=self.read_loop, name="link-" + device, daemon=True)
+        self.reader.start()
+
+    def read_loop(self):
+        # lines read while no client is attached are dropped, the next client starts clean
+        partial = b""  # a read that timed out mid-line, completed by the next one
+        while self.alive:
+            try:
+                line = self.port.readline()
+            except (serial.SerialException, OSError):
+                break  # unplugged
+            if not line:
+                continue
+            if not line.endswith(b"\n"):
+                partial += line
+                continue
+            line, partial = partial + line, b""
+            with self.lock:
+                if self.sync_marker is not None:
+                    self.resync(line)
+                    continue
+                client = self.client
+            if client is not None:
+                try:
+                    client.sendall(line)
+                except OSError:
+                    pass  # the client is going away, its handler detaches it
+        self.alive = False
+        with self.lock:
+            if self.client is not None:
+                try:
+                    self.client.shutdown(socket.SHUT_RDWR)  # ends the client's session
+                except OSError:
+                    pass
+
+    def resync(self, line):
+        # called with the lock held for every line read while a client waits to be attached
+        if self.sync_marker in line:
+            self.marker_seen = True
+        elif self.marker_seen and line.startswith(b"ok"):
+            # the reply goes out before any printer output is forwarded to the client
+            self.sync_marker = None
+            try:
+                send_message(self.client, {"ok": True, "port": self.device, "baud": self.baudrate})
+            except OSError:
+                pass  # the client gave up, its handler detaches it
+            self.synced.set()
+
+    def attach(self, client):
+        # None once the client is attached, else the reason it was not
+        with self.lock:
+            if self.client is not None:
+                return self.device + " is in use by another client"
+            self.client = client
+            self.sync_marker = "zoffset-sync {0}".format(next(self.markers)).encode("Ascii")
+            self.marker_seen = False
+            self.synced.clear()
+            # the leading newline ends any partial line the previous client left behind
+            self.port.write(b"\nM118 " + self.sync_marker + b"\n")
+        if self.synced.wait(SYNC_TIMEOUT):
+            return None
+        with self.lock:
+            if self.sync_marker is None:
+                return None  # synced just after the wait timed out
+            self.sync_marker = None
+            self.client = None
+        return self.device + " did not answer the resync, still busy with the previous client's commands"
+
+    def detach(self, client):
+        with self.lock:
+            if self.client is client:
+                self.client = None
+
+    def write(self, data):
+        self.port.write(data)
+
+    def close(self):
+        self.alive = False
+        self.port.close()
+
+
+class SerialDaemon:
+    def __init__(self, path=SOCKET_FILE, baudrate=None):
+        self.path = path
+        self.baudrate = baudrate
+        self.links = {}  # device -> PrinterLink
+        self.lock = threading.Lock()
+
+    def open_link(self, device, baudrate):
+        # the open link for device (any printer when None), opening and handshaking it if needed
+        with self.lock:
+            for name, link in list(self.links.items()):
+                if not link.alive:
+                    del self.links[name]
+            if device is None and self.links:
+                return next(iter(self.links.values()))
+            if device in self.links:
+                return self.links[device]
+            baudrates = BAUD_RATES if baudrate is None else (baudrate,)
+            if device is None:
+                port, device, baudrate = discover_printer(baudrates)
+            else:
+                port, baudrate = open_printer(device, baudrates)
+            if port is None:
+                raise OSError("no printer found" if device is None else "no printer answering on " + device)
+            link = PrinterLink(device, baudrate, port)
+            self.links[device] = link
+            print("opened " + device + " at " + str(baudrate))
+            return link
+
+    def handle(self, conn):
+        try:
+            request = receive_message(conn)
+            if request.get("action") == "status":
+                send_message(conn, {"ok": True, "ports": [
+                    {"port": link.device, "baud": link.baudrate, "attached": link.client is not None}
+                    for link in self.links.values() if link.alive]})
+                return
+            try:
+                link = self.open_link(request.get("port"), request.get("baud") or self.baudrate)
+            except OSError as e:
+                send_message(conn, {"ok": False, "error": str(e)})
+                return
+            error = link.attach(conn)
+            if error is not None:
+                send_message(conn, {"ok": False, "error": error})
+                return
+            try:
+                while True:
+                    data = conn.recv(4096)
+                    if not data:
+                        break
+                    link.write(data)
+            finally:
+                link.detach(conn)
+        except (OSError, ValueError, serial.SerialException):
+            pass
+        finally:
+            conn.close()
+
+    def serve_forever(self, devices=()):
+        # returns the exit status
+        if daemon_running(self.path):
+            print("a serial daemon is already listening on " + self.path)
+            return 1
+        for device in devices:
+            try:
+                self.open_link(device, self.baudrate)
+            except OSError as e:
+                print(str(e))
+        if os.path.exists(self.path):
+            os.remove(self.path)  # left behind by a daemon that was killed
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.path)
+        server.listen()
+        print("serial daemon listening on " + self.path)
+        try:
+            while True:
+                conn, address = server.accept()
+                threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+            os.remove(self.path)
+            for link in self.links.values():
+                link.close()
+        return 0
+
+
+class DaemonPort:
+    # the parts of serial.Serial the adjuster and the tester use, over the daemon's socket
+    def __init__(self, device=None, baudrate=None, timeout=None, path=SOCKET_FILE):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.sock.settimeout(ATTACH_TIMEOUT)
+            self.sock.connect(path)
+            send_message(self.sock, {"port": device, "baud": baudrate})
+            reply = receive_message(self.sock)
+        except (OSError, ValueError):
+            self.sock.close()
+            raise
+        if not reply["ok"]:
+            self.sock.close()
+            raise OSError("serial daemon: " + reply["error"])
+        # blocking from here on: the writer thread's sendall() must never see the reader's timeouts
+        self.sock.settimeout(None)
+        self.device = reply["port"]
+        self.baudrate = reply["baud"]
+        self.timeout = timeout
+        self.buffer = bytearray()
+
+    def write(self, data):
+        self.sock.sendall(data)
+        return len(data)
+
+    def receive(self, timeout):
+        # False when nothing arrived within timeout, None waits for data
+        try:
+            if not select.select([self.sock], [], [], timeout)[0]:
+                return False
+        except ValueError:  # closed by another thread
+            raise OSError("serial daemon connection closed")
+        chunk = self.sock.recv(4096)
+        if not chunk:
+            raise OSError("serial daemon closed the connection")
+        self.buffer += chunk
+        return True
+
+    def readline(self):
+        # like serial.Serial.readline: b"" when nothing complete arrived within timeout
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while b"\n" not in self.buffer:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return b""
+            if not self.receive(remaining):
+                return b""
+        end = self.buffer.index(b"\n") + 1
+        line = bytes(self.buffer[:end])
+        del self.buffer[:end]
+        return line
+
+    @property
+    def in_waiting(self):
+        if select.select([self.sock], [], [], 0)[0]:
+            self.receive(0)
+        return len(self.buffer)
+
+    def close(self):
+        # shutdown wakes up a reader thread blocked in recv and tells the daemon at once
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+def connect_daemon(device=None, baudrate=None, timeout=None, path=SOCKET_FILE):
+    # a DaemonPort when a daemon is running, None otherwise; OSError if the daemon cannot provide the port
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(path):
+        return None  # no daemon (or no Unix sockets on this Python)
+    try:
+        return DaemonPort(device, baudrate, timeout, path)
+    except (ConnectionRefusedError, FileNotFoundError):
+        return None  # socket file left behind by a daemon that is gone
+
+
+def daemon_running(path):
+    # False when there is no socket or only one left behind by a daemon that was killed
+    if not os.path.exists(path):
+        return False
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(path)
+    except (ConnectionRefusedError, FileNotFoundError):
+        return False
+    finally:
+        conn.close()
+    return True
+
+
+def print_status(path):
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    conn.connect(path)
+    send_message(conn, {"action": "status"})
+    for link in receive_message(conn)["ports"]:
+        print("{0} {1} {2}".format(link["port"], link["baud"], "attached" if link["attached"] else "idle"))
+    conn.close()
+
+
+if __name__ == "__main__":
+    import argparse  # the command line only, clients import this module too
+    import signal
+
+    parser = argparse.ArgumentParser(description="Keep printer serial ports open for the adjuster and the tester.")
+    parser.add_argument("action", nargs="?", choices=("serve", "status"), default="serve")
+    parser.add_argument("--socket", default=SOCKET_FILE)
+    parser.add_argument("--port", action="append", default=[], help="open this port at start, repeat for more")
+    parser.add_argument("--baud", type=int, help="fixed baud rate instead of detecting it")
+    args = parser.parse_args()
+    if args.action == "status":
+        print_status(args.socket)
+    else:
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))  # clean up the socket file too
+        sys.exit(SerialDaemon(args.socket, args.baud).serve_forever(args.port))
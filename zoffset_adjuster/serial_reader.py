@@ -0,0 +1,96 @@
+# Background reader for the printer serial port.
+# One thread blocks on the port, reads every response line exactly once and
+# hands it to the handler routed for that kind of line, so the rest of the
+# code never has to poll in_waiting.  Lines no handler takes (busy
+# keepalives, stray "ok"s, boot messages) are dropped, nothing piles up
+# over a long session.
+
+import re
+import threading
+
+# kinds of response lines the printer sends back
+OK = "ok"
+TEMPERATURE = "temperature"
+BUSY = "busy"
+FIRMWARE = "firmware"
+PROBE_OFFSET = "probe_offset"
+RESEND = "resend"
+OTHER = "other"
+
+RESPONSE_KINDS = (OK, TEMPERATURE, BUSY, FIRMWARE, PROBE_OFFSET, RESEND, OTHER)
+
+# first field of a temperature report: "T:", "B:", "C:" or a tool "T0:", "T1:", ...
+TEMPERATURE_FIELD = re.compile(r"[TBC]\d*:")
+
+# how often a blocking wait wakes up, keeps Ctrl-C working on Windows
+WAKEUP_INTERVAL = 0.5
+
+
+def classify_response(line):
+    if line == "ok" or line.startswith("ok "):
+        return OK
+    if TEMPERATURE_FIELD.match(line):  # multi-tool firmwares may start with "T0:"
+        return TEMPERATURE
+    if line.startswith("echo:busy"):
+        return BUSY
+    if line.startswith("FIRMWARE_NAME"):
+        return FIRMWARE
+    if line.startswith("Resend:") or line.startswith("rs "):  # a numbered line was rejected
+        return RESEND
+    if "Probe Z Offset" in line or "Probe Offset" in line:  # Marlin 1.1.9 / 2.0.7.2
+        return PROBE_OFFSET
+    return OTHER
+
+
+class SerialReader(threading.Thread):
+    def __init__(self, port, debug=False):
+        super().__init__(name="serial-reader", daemon=True)
+        self.port = port
+        self.debug = debug
+        self.running = True
+        self.handlers = {}
+        self.dropped = 0  # lines no handler took
+        self.tracer = None  # optional CommandTracer, sees every line
+        self.lock = threading.Lock()
+
+    def run(self):
+        while self.running:
+            try:
+                raw = self.port.readline()
+            except (OSError, TypeError, AttributeError):
+                # port closed or device unplugged
+                break
+            if not raw:  # read timed out, nothing to do
+                continue
+            self.dispatch(raw.decode("Ascii", errors="replace").strip())
+        self.running = False
+
+    def stop(self):
+        self.running = False
+
+    def dispatch(self, line):
+        if line == "":
+            return
+        kind = classify_response(line)
+        if self.debug:
+            print("Received (" + kind + "): " + line)
+        if self.tracer is not None:
+            self.tracer.line_read(line, kind)
+        with self.lock:
+            handler = self.handlers.get(kind)
+        if handler is not None:
+            handler(line)
+        else:
+            self.drop(line)
+
+    def drop(self, line):
+        # a line nobody is waiting for, only counted
+        self.dropped += 1
+
+    def route(self, kind, handler):
+        # send lines of this kind to handler(line), passing None drops them again
+        with self.lock:
+            if handler is None:
+                self.handlers.pop(kind, None)
+            else:
+                self.handlers[kind] = handler
@@ -0,0 +1,187 @@
+# Binary serial session recorder and memory-mapped replay.
+# RecordingPort sits between the adjuster and the real port and appends
+# every chunk written and every line read, with a monotonic timestamp, to a
+# compact binary log.  ReplayPort memory-maps such a log and plays the
+# printer's side back, at the original pace or faster, so parsing paths
+# can be profiled and regression-tested against long captures without
+# loading them into RAM or sitting in front of the printer.
+#
+# Log layout: MAGIC, then records of RECORD_HEADER (direction, seconds
+# since the start of the recording, payload length) followed by the payload.
+#
+#   python -m zoffset_adjuster.session_log dump capture.zlog
+#   python -m zoffset_adjuster.session_log replay capture.zlog [--speed 10]
+
+import argparse
+import collections
+import mmap
+import struct
+import threading
+import time
+
+MAGIC = b"ZOSL\x01"
+RECORD_HEADER = struct.Struct("<BdI")
+TO_PRINTER = 0
+FROM_PRINTER = 1
+
+
+class RecordingPort:
+    def __init__(self, port, path):
+        self.port = port
+        # unbuffered: each record is one write, so a crash loses at most the record in flight
+        self.log = open(path, "ab", buffering=0)
+        if self.log.tell() == 0:
+            self.log.write(MAGIC)
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+
+    def record(self, direction, data):
+        with self.lock:
+            if self.log is None:
+                return
+            self.log.write(RECORD_HEADER.pack(direction, time.monotonic() - self.started, len(data)) + data)
+
+    def write(self, data):
+        self.record(TO_PRINTER, data)
+        return self.port.write(data)
+
+    def readline(self):
+        line = self.port.readline()
+        if line:
+            self.record(FROM_PRINTER, line)
+        return line
+
+    def close(self):
+        self.port.close()
+        with self.lock:
+            self.log.close()
+            self.log = None
+
+    def __getattr__(self, name):
+        # everything else (timeout, in_waiting, ...) is the real port's
+        return getattr(self.port, name)
+
+
+def read_record(data, offset):
+    # returns (direction, timestamp, payload start, payload length, next offset) or None at the end
+    if offset + RECORD_HEADER.size > len(data):
+        return None
+    direction, timestamp, length = RECORD_HEADER.unpack_from(data, offset)
+    start = offset + RECORD_HEADER.size
+    if start + length > len(data):
+        return None  # truncated last record, the recorder was killed mid-write
+    return direction, timestamp, start, length, start + length
+
+
+def read_records(data):
+    # yields (direction, timestamp, payload) from a log held in a bytes-like object or mmap
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("not a serial session log")
+    record = read_record(data, len(MAGIC))
+    while record is not None:
+        direction, timestamp, start, length, offset = record
+        yield direction, timestamp, data[start:start + length]
+        record = read_record(data, offset)
+
+
+class ReplayPort:
+    # Follows the adjuster: every command written is looked up in the log
+    # (from the current position on) and the printer lines recorded after it,
+    # up to the next recorded command, are played back with their original
+    # spacing divided by speed.  Recorded commands the adjuster does not send
+    # are skipped together with their responses.
+    def __init__(self, path, speed=1.0, timeout=None):
+        # speed 0 plays the responses back as fast as they are read
+        self.log = open(path, "rb")
+        self.data = mmap.mmap(self.log.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:len(MAGIC)] != MAGIC:
+            raise ValueError("not a serial session log")
+        self.cursor = len(MAGIC)
+        self.speed = speed
+        self.timeout = timeout
+        self.ready = collections.deque()  # (due time, payload start, payload length)
+        self.ready_changed = threading.Condition()
+        self.closed = False
+
+    def find_command(self, data):
+        # offset just past the next recorded command equal to data, and its timestamp
+        record = read_record(self.data, self.cursor)
+        while record is not None:
+            direction, timestamp, start, length, offset = record
+            if direction == TO_PRINTER and self.data[start:start + length] == data:
+                return offset, timestamp
+            record = read_record(self.data, offset)
+        return None, None
+
+    def write(self, data):
+        with self.ready_changed:
+            offset, sent_at = self.find_command(data)
+            if offset is None:
+                return len(data)  # not in the capture, the printer stays silent
+            now = time.monotonic()
+            record = read_record(self.data, offset)
+            while record is not None and record[0] == FROM_PRINTER:
+                direction, timestamp, start, length, offset = record
+                delay = (timestamp - sent_at) / self.speed if self.speed else 0
+                self.ready.append((now + delay, start, length))
+                record = read_record(self.data, offset)
+            self.cursor = offset
+            self.ready_changed.notify_all()
+        return len(data)
+
+    def readline(self):
+        with self.ready_changed:
+            if not self.ready_changed.wait_for(lambda: self.ready or self.closed, self.timeout):
+                return b""  # timed out like a quiet serial port
+            if self.closed:
+                raise OSError("replay port closed")
+            due, start, length = self.ready.popleft()
+        delay = due - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        return bytes(self.data[start:start + length])
+
+    @property
+    def in_waiting(self):
+        return len(self.ready)
+
+    def close(self):
+        with self.ready_changed:
+            self.closed = True
+            self.ready_changed.notify_all()
+        self.log.close()  # the mapping stays valid until it is garbage collected
+
+
+def dump(path):
+    with open(path, "rb") as log:
+        data = mmap.mmap(log.fileno(), 0, access=mmap.ACCESS_READ)
+        for direction, timestamp, payload in read_records(data):
+            arrow = "->" if direction == TO_PRINTER else "<-"
+            print("{0:12.6f} {1} {2}".format(timestamp, arrow, bytes(payload).decode("Ascii", errors="replace").rstrip()))
+        data.close()
+
+
+def replay(path, speed):
+    # runs the firmware and probe offset queries against a capture and times them
+    from .adjuster import ZOffsetAdjuster  # the adjuster imports this module
+    adjuster = ZOffsetAdjuster()
+    adjuster.STORE_FILE = ""  # a replay must not read or write the calibration history
+    adjuster.PRINTER = ReplayPort(path, speed=speed)
+    adjuster.start_reader()
+    started = time.perf_counter()
+    adjuster.get_firmware_version()
+    adjuster.save_current_z_offset()
+    print("replayed in {0:.3f}s".format(time.perf_counter() - started))
+    adjuster.close_printer()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or replay a recorded serial session.")
+    parser.add_argument("action", choices=("dump", "replay"))
+    parser.add_argument("log")
+    parser.add_argument("--speed", type=float, default=0, help="replay speed, 0 = as fast as possible")
+    args = parser.parse_args()
+    if args.action == "dump":
+        dump(args.log)
+    else:
+        replay(args.log, args.speed)
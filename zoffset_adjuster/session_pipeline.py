@@ -0,0 +1,46 @@
+# Staged calibration session.
+# Stages run in order.  Heating is started before the first stage and only
+# stages that need the heaters at temperature wait for them, so everything
+# in front of the first thermal stage overlaps with the heat-up.
+
+import time
+
+
+class Stage:
+    def __init__(self, name, run, needs_heat=False):
+        self.name = name
+        self.run = run
+        self.needs_heat = needs_heat
+        self.elapsed = None
+
+
+class SessionPipeline:
+    def __init__(self, start_heating, wait_for_heat, on_stage=None):
+        self.start_heating = start_heating
+        self.wait_for_heat = wait_for_heat
+        self.on_stage = on_stage  # called with each phase name as it starts
+        self.stages = []
+        self.heat_wait = None  # time spent blocked on the heaters
+
+    def add_stage(self, name, run, needs_heat=False):
+        self.stages.append(Stage(name, run, needs_heat))
+
+    def run(self):
+        heated = False
+        self.notify("preheat")
+        self.start_heating()
+        for stage in self.stages:
+            if stage.needs_heat and not heated:
+                self.notify("wait for heat")
+                started = time.monotonic()
+                self.wait_for_heat()
+                self.heat_wait = time.monotonic() - started
+                heated = True
+            self.notify(stage.name)
+            started = time.monotonic()
+            stage.run()
+            stage.elapsed = time.monotonic() - started
+
+    def notify(self, name):
+        if self.on_stage is not None:
+            self.on_stage(name)
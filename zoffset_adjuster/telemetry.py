@@ -0,0 +1,116 @@
+# Temperature telemetry.
+# Every temperature report (M155) is parsed once and kept per heater in a
+# fixed-size ring buffer of (time, temperature, target, power) samples, so
+# a long farm run never grows memory.  Listeners such as the
+# TemperatureMonitor get each parsed report, and the buffers can be
+# exported as CSV at any time to compare how fast printers heat up.
+
+import math
+import threading
+import time
+from array import array
+
+from .serial_reader import TEMPERATURE
+from .temp_report import parse_temp_report, BED, CHAMBER, HOTEND, PROBE
+
+REPORT_INTERVAL = 1  # seconds between reports, the N of M155 S<N>
+CAPACITY = 3600  # samples kept per heater, an hour at one report per second
+EXPORT_FILE = "zoffset_telemetry.csv"  # on-demand export when no file is configured
+
+
+class SampleRing:
+    # the last capacity samples in four preallocated arrays, missing values are nan
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.times = array("d", bytes(8 * capacity))
+        self.temps = array("d", bytes(8 * capacity))
+        self.targets = array("d", bytes(8 * capacity))
+        self.powers = array("d", bytes(8 * capacity))
+        self.next = 0  # slot the next sample goes to
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, seconds, temp, target, power):
+        i = self.next
+        self.times[i] = seconds
+        self.temps[i] = temp
+        self.targets[i] = math.nan if target is None else target
+        self.powers[i] = math.nan if power is None else power
+        self.next = (i + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def samples(self):
+        # oldest first
+        start = (self.next - self.count) % self.capacity
+        for n in range(self.count):
+            i = (start + n) % self.capacity
+            yield self.times[i], self.temps[i], self.targets[i], self.powers[i]
+
+
+class Telemetry:
+    def __init__(self, reader, capacity=CAPACITY):
+        self.reader = reader
+        self.capacity = capacity
+        self.rings = {}  # heater key ("T", "B", "T0", ...) -> SampleRing
+        self.listeners = []  # called with each parsed TempReport, on the reader thread
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+
+    def start(self):
+        self.reader.route(TEMPERATURE, self.feed)
+
+    def stop(self):
+        self.reader.route(TEMPERATURE, None)
+
+    def add_listener(self, listener):
+        with self.lock:
+            self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        with self.lock:
+            if listener in self.listeners:
+                self.listeners.remove(listener)
+
+    def feed(self, line):
+        report = parse_temp_report(line)
+        if report is None:
+            return
+        seconds = time.monotonic() - self.started
+        readings = [(HOTEND, report.hotend), (BED, report.bed), (CHAMBER, report.chamber), (PROBE, report.probe)]
+        readings += [(HOTEND + str(index), tool) for index, tool in enumerate(report.tools)]
+        with self.lock:
+            for key, reading in readings:
+                if reading is None:
+                    continue
+                ring = self.rings.get(key)
+                if ring is None:
+                    ring = self.rings[key] = SampleRing(self.capacity)
+                ring.append(seconds, reading.current, reading.target, reading.power)
+            listeners = list(self.listeners)
+        for listener in listeners:
+            listener(report)
+
+    def heating_rate(self, key):
+        # average deg/s over the samples taken while the heater was below a set target, None if unknown
+        with self.lock:
+            ring = self.rings.get(key)
+            ramp = [] if ring is None else [
+                (seconds, temp) for seconds, temp, target, power in ring.samples()
+                if target > 0 and temp < target]
+        if len(ramp) < 2 or ramp[-1][0] == ramp[0][0]:
+            return None
+        return (ramp[-1][1] - ramp[0][1]) / (ramp[-1][0] - ramp[0][0])
+
+    def export(self, path):
+        # CSV of every buffered sample, returns the number of rows written
+        with self.lock:
+            rows = [(key,) + sample for key, ring in sorted(self.rings.items()) for sample in ring.samples()]
+        with open(path, "w") as csv_file:
+            csv_file.write("heater,seconds,temperature,target,power\n")
+            for key, seconds, temp, target, power in rows:
+                csv_file.write("{0},{1:.3f},{2:.2f},{3},{4}\n".format(
+                    key, seconds, temp, "" if math.isnan(target) else "{0:.2f}".format(target),
+                    "" if math.isnan(power) else "{0:.0f}".format(power)))
+        return len(rows)
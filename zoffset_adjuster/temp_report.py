@@ -0,0 +1,78 @@
+# Parser for Marlin temperature reports (M105 / M155 auto reports).
+# Example temp report from printer: "T:18.12 /0.00 B:34.11 /0.00 @:0 B@:0"
+# Multi-tool printers add "T0:.. /.. T1:.. /.. @0:.. @1:..", others report
+# chamber (C), probe (P), redundant (R) or cooler (L) sensors.  Fields may
+# come in any order, the key:value pairs are matched in a single regex pass.
+
+import collections
+import re
+
+# "T:18.12 /0.00", "T1:200.0 /210.0", "B@:127", "@0:64", raw ADC values "(4056)" are skipped
+FIELD = re.compile(r"([A-Z]?)(\d*)(@?)(\d*):\s*(-?\d+\.?\d*)(?:\s*/\s*(-?\d+\.?\d*))?")
+
+# heater/sensor letters as they appear in the report
+HOTEND = "T"
+BED = "B"
+CHAMBER = "C"
+PROBE = "P"
+REDUNDANT = "R"
+COOLER = "L"
+
+HeaterReading = collections.namedtuple("HeaterReading", "current target power")
+TempReport = collections.namedtuple("TempReport", "hotend bed chamber probe tools")
+
+
+def parse_temp_report(line):
+    # returns a TempReport, or None if the line carries no temperatures
+    # hotend is the active tool, tools holds one reading per T<n> in tool order
+    temps = {}
+    powers = {}
+    tool_temps = {}
+    tool_powers = {}
+    for letter, tool, at, power_tool, value, target in FIELD.findall(line):
+        if at:  # heater power, "@:" is the active hotend
+            if letter == "":
+                if power_tool:
+                    tool_powers[int(power_tool)] = float(value)
+                else:
+                    powers[HOTEND] = float(value)
+            else:
+                powers[letter] = float(value)
+        elif letter == HOTEND and tool:
+            tool_temps[int(tool)] = (float(value), float(target) if target else None)
+        elif letter:
+            temps[letter] = (float(value), float(target) if target else None)
+    if not temps and not tool_temps:
+        return None
+    tools = tuple(
+        HeaterReading(current, target, tool_powers.get(index))
+        for index, (current, target) in sorted(tool_temps.items()))
+    hotend = reading(temps, powers, HOTEND)
+    if hotend is None and tools:  # some firmwares only report T0.. for multi-tool machines
+        hotend = tools[0]
+    return TempReport(
+        hotend, reading(temps, powers, BED), reading(temps, powers, CHAMBER),
+        reading(temps, powers, PROBE), tools)
+
+
+def reading(temps, powers, letter):
+    value = temps.get(letter)
+    if value is None:
+        return None
+    return HeaterReading(value[0], value[1], powers.get(letter))
+
+
+def select_heater(report, key):
+    # key is a report letter ("T", "B", "C", "P") or a tool ("T0", "T1", ...)
+    if key == HOTEND:
+        return report.hotend
+    if key == BED:
+        return report.bed
+    if key == CHAMBER:
+        return report.chamber
+    if key == PROBE:
+        return report.probe
+    if key.startswith(HOTEND) and key[1:].isdigit():
+        index = int(key[1:])
+        return report.tools[index] if index < len(report.tools) else None
+    return None
@@ -0,0 +1,144 @@
+# Watches the printer's temperature reports (M155) for several heaters at
+# once.  Telemetry hands over every parsed report, callers block in wait()
+# until all heaters have reached their targets.
+#
+# A heater is ready once a sliding window of its latest samples is stable:
+# every sample within the tolerance of the target and the trend fitted
+# through them drifting by less than the tolerance over the window.  One
+# sample at the target is not enough, it may be the peak of an overshoot.
+# A heater that swings wider than the tolerance (a bang-bang bed) never
+# passes the window, so after SETTLE_LIMIT reports near the target it falls
+# back to the single sample rule: at the target with the power below its
+# limit.  While heating, the slope of the window gives an estimate of the
+# time left.
+
+import collections
+import threading
+import time
+
+from .temp_report import select_heater, BED, HOTEND
+
+EXTRUDER = HOTEND
+TOLERANCE = 1.0  # degrees either side of the target that count as settled
+WINDOW = 8  # samples that must all be settled, 8s at one report per second
+SETTLE_LIMIT = 30  # reports near the target before the single sample rule is used instead
+
+
+class Heater:
+    def __init__(self, name, key, target, power_limit, tolerance=TOLERANCE, window=WINDOW,
+                 settle_limit=SETTLE_LIMIT):
+        # key selects the heater in the report: "T", "B", "C" or a tool "T0", "T1", ...
+        self.name = name
+        self.key = key
+        self.target = float(target)
+        self.power_limit = power_limit  # the single sample rule needs the power below this
+        self.tolerance = tolerance
+        self.samples = collections.deque(maxlen=max(window, 2))  # (seconds, temperature)
+        self.settle_limit = settle_limit
+        self.settling = 0  # reports since the heater first came near the target
+        self.current = None
+        self.power = None
+        self.ready_after = None  # seconds from monitor start
+
+    def update(self, current, power, elapsed):
+        self.current = current
+        self.power = power
+        self.samples.append((elapsed, current))
+        if self.settling or current >= self.target - self.tolerance:
+            self.settling += 1
+        if self.ready_after is None and (self.stable() or self.settle_timed_out()):
+            self.ready_after = elapsed
+
+    def settle_timed_out(self):
+        # the single sample rule, once the window has had long enough to settle
+        if self.settling < self.settle_limit:
+            return False
+        powered_down = self.power is None or self.power < self.power_limit  # not every firmware reports power
+        return powered_down and self.current >= self.target
+
+    def slope(self):
+        # least squares degrees per second over the window, None with too few samples
+        n = len(self.samples)
+        if n < 2:
+            return None
+        mean_t = sum(t for t, temp in self.samples) / n
+        mean_temp = sum(temp for t, temp in self.samples) / n
+        spread = sum((t - mean_t) ** 2 for t, temp in self.samples)
+        if spread == 0:
+            return None
+        return sum((t - mean_t) * (temp - mean_temp) for t, temp in self.samples) / spread
+
+    def stable(self):
+        if len(self.samples) < self.samples.maxlen:
+            return False
+        if any(abs(temp - self.target) > self.tolerance for t, temp in self.samples):
+            return False
+        slope = self.slope()
+        span = self.samples[-1][0] - self.samples[0][0]
+        return slope is not None and abs(slope) * span <= self.tolerance
+
+    def eta(self):
+        # seconds until the target is reached at the current rate, None when not heating towards it
+        slope = self.slope()
+        if self.current is None or slope is None or slope <= 0 or self.current >= self.target - self.tolerance:
+            return None
+        return (self.target - self.tolerance - self.current) / slope
+
+    def status(self):
+        current = "--" if self.current is None else "{0:.1f}".format(self.current)
+        if self.ready_after is not None:
+            mark = " ok"
+        elif self.current is not None and self.current >= self.target - self.tolerance:
+            mark = " settling"  # at the target or overshooting it
+        else:
+            eta = self.eta()
+            mark = "" if eta is None else " ({0:.0f}s)".format(eta)
+        return "{0}: {1} -> {2:.0f}{3}".format(self.name, current, self.target, mark)
+
+
+class TemperatureMonitor:
+    def __init__(self, telemetry):
+        self.telemetry = telemetry
+        self.heaters = []
+        self.started = None
+        self.updated = threading.Condition()
+
+    def add_heater(self, name, key, target, power_limit, tolerance=TOLERANCE, window=WINDOW,
+                   settle_limit=SETTLE_LIMIT):
+        self.heaters.append(Heater(name, key, target, power_limit, tolerance, window, settle_limit))
+
+    def start(self):
+        self.started = time.monotonic()
+        self.telemetry.add_listener(self.feed)
+
+    def stop(self):
+        self.telemetry.remove_listener(self.feed)
+
+    def feed(self, report):
+        # called on the reader thread with each parsed report
+        elapsed = time.monotonic() - self.started
+        with self.updated:
+            for heater in self.heaters:
+                reading = select_heater(report, heater.key)
+                if reading is not None:
+                    heater.update(reading.current, reading.power, elapsed)
+            self.updated.notify_all()
+
+    def ready(self):
+        return all(heater.ready_after is not None for heater in self.heaters)
+
+    def status(self):
+        return "   ".join(heater.status() for heater in self.heaters)
+
+    def wait(self):
+        # blocks until every heater is stable at temperature, keeping a combined progress line
+        with self.updated:
+            while not self.ready():
+                self.updated.wait(timeout=1)
+                print("\r " + self.status() + "   ", end="")  # padded over a longer previous line
+        print("")
+
+    def time_saved(self):
+        # heating one after the other would have taken the sum of the ramps
+        ramps = [heater.ready_after for heater in self.heaters]
+        return sum(ramps) - max(ramps)
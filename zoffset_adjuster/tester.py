@@ -0,0 +1,61 @@
+# Serial connection tester.
+# Homes the printer and moves Z, or streams a G-code file as fast as the
+# firmware takes it, to check a printer connection outside a calibration
+# session.  Runs as "zoffset tester".
+
+import sys
+
+from .gcode_streamer import StreamingQueue, gcode_lines
+from .transport import PrinterTransport
+
+
+class SerialTester(PrinterTransport):
+    DEBUG_STRINGS = True
+
+    def send_printer_cmd_loop(self):
+        while True:
+            print("Enter a printer command (q to quit): ", end="")
+            prt_cmd = input()
+            if prt_cmd == 'q':
+                print("Goodbye")
+                return
+            print("You entered " + prt_cmd)
+            # the reader prints each response line, the queue returns once the "ok" arrives
+            self.wait_for_cmd(prt_cmd.upper())
+
+    def stream_gcode(self, source, depth, rx_buffer):
+        # sends a whole file through a character-counting window instead of one line per "ok"
+        self.READER.debug = False  # printing every "ok" would slow the stream down
+        stream = StreamingQueue(self.PRINTER, self.READER, depth, rx_buffer)  # takes over the "ok" lines
+        self.COMMANDS = stream
+        print("Streaming...")
+        count, elapsed = stream.stream(gcode_lines(source))
+        print("{0} lines in {1:.2f}s, {2:.0f} lines/s, {3} resends, {4} buffer underruns".format(
+            count, elapsed, count / elapsed if elapsed > 0 else 0, stream.resends, stream.underruns))
+
+
+def run_tester(stream=None, depth=4, rx_buffer=128, port=None):
+    # returns the exit status
+    serial_tester = SerialTester()
+    if port is not None:
+        serial_tester.PRINTER_PORT = port
+    try:
+        status = serial_tester.init_printer()
+    except OSError as e:
+        print(str(e))
+        status = False
+    if not status:
+        print("could not find a connected printer, exiting.")
+        return 1
+    try:
+        if stream == "-":
+            serial_tester.stream_gcode(sys.stdin, depth, rx_buffer)
+        elif stream is not None:
+            with open(stream, "r") as gcode_file:
+                serial_tester.stream_gcode(gcode_file, depth, rx_buffer)
+        else:
+            serial_tester.send_sync_cmd("G28", "Homing printer...")
+            serial_tester.send_sync_move_cmd("G0 Z10", "Moving Z to 10...")
+    finally:
+        serial_tester.close_printer()
+    return 0
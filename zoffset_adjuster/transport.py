@@ -0,0 +1,152 @@
+# Printer connection shared by the adjuster, the tester and the CLI.
+# Finds or opens the printer (through the serial daemon when one is
+# running, else the port with its baud rate detected), starts the reader
+# thread and the command queue, and sends commands synchronously.  Only
+# what a quick query needs is imported here, so "zoffset probe" starts in
+# a few tens of milliseconds.
+
+import re
+
+from .command_queue import CommandQueue
+from .port_discovery import BAUD_RATES, discover_printer, open_printer
+from .serial_daemon import SOCKET_FILE, connect_daemon
+from .serial_reader import SerialReader
+
+
+def parse_probe_offset(responses):
+    # the probe Z-offset from an M851 report as text, e.g. "-2.50", or "" when there is none
+    current_offset = ""
+    for prt_response in responses:
+        if "Probe Z Offset" in prt_response:  # Marlin 1.1.9
+            tokens = prt_response.split(":")
+            current_offset = tokens[2].strip()
+        elif "Probe Offset" in prt_response:  # Marlin 2.0.7.2
+            tokens = prt_response.split()
+            current_offset = tokens[4].lstrip("Z")
+    return current_offset
+
+
+class PrinterTransport:
+    BAUD_RATES = BAUD_RATES  # candidates for auto detection, or the one configured rate
+    COMMANDS = None
+    DAEMON_SOCKET = SOCKET_FILE  # serial daemon socket, empty to always open the port directly
+    DEBUG_STRINGS = False  # print every command sent and every line received
+    MACHINE_FIRMWARE_NAME = ""
+    MACHINE_FIRMWARE_VERSION = ""
+    MACHINE_UUID = ""
+    PRINTER_PORT = ""
+    PRINTER = None
+    READER = None
+    SERIAL_SPEED = 115200  # the rate in use once connected
+    SERIAL_TIMEOUT = 30
+
+    def init_printer(self):
+        if self.PRINTER_PORT != "":
+            print("Using printer port " + self.PRINTER_PORT + ".")  # from the config file or --port
+            self.open_port()
+            self.start_reader()
+            self.get_firmware_version()
+            return True
+        daemon_port = self.connect_daemon(None)
+        if daemon_port is not None:
+            self.PRINTER = daemon_port
+            self.PRINTER_PORT = daemon_port.device
+            self.SERIAL_SPEED = daemon_port.baudrate
+            print("Using printer on port " + daemon_port.device + " from the serial daemon.")
+            self.start_reader()
+            self.get_firmware_version()
+            return True
+        print("Searching serial ports for a printer, please wait...", end='')
+        # every port is probed at once with M115, the boot output is flushed by the handshake
+        printer_port, test_port, baudrate = discover_printer(self.BAUD_RATES)
+        if printer_port is None:
+            return False
+        printer_port.timeout = self.SERIAL_TIMEOUT
+        self.PRINTER = printer_port
+        self.PRINTER_PORT = test_port
+        self.SERIAL_SPEED = baudrate
+        print("printer detected on port " + test_port + " at " + str(baudrate) + " baud")
+        self.start_reader()
+        self.get_firmware_version()
+        return True
+
+    def open_port(self):
+        self.PRINTER = self.connect_daemon(self.PRINTER_PORT)
+        if self.PRINTER is not None:
+            self.SERIAL_SPEED = self.PRINTER.baudrate
+            return
+        # the M115 handshake finds the fastest rate the board answers at
+        printer_port, baudrate = open_printer(self.PRINTER_PORT, self.BAUD_RATES)
+        if printer_port is None:
+            raise OSError("no printer answering on " + self.PRINTER_PORT)
+        printer_port.timeout = self.SERIAL_TIMEOUT
+        self.PRINTER = printer_port
+        self.SERIAL_SPEED = baudrate
+
+    def connect_daemon(self, device):
+        # the daemon's already open and initialised port (any printer when device is None),
+        # None when no daemon is running
+        if self.DAEMON_SOCKET == "":
+            return None
+        baudrate = self.BAUD_RATES[0] if len(self.BAUD_RATES) == 1 else None  # None: the daemon detects it
+        return connect_daemon(device, baudrate, self.SERIAL_TIMEOUT, self.DAEMON_SOCKET)
+
+    def start_reader(self):
+        # from here on only the reader thread reads from the port
+        self.READER = SerialReader(self.PRINTER, debug=self.DEBUG_STRINGS)
+        self.COMMANDS = CommandQueue(self.PRINTER, self.READER)
+        self.attach_handlers()
+        self.READER.start()
+
+    def attach_handlers(self):
+        # routes set up here see every line from the first one on
+        pass
+
+    def close_printer(self):
+        # closing the port also ends the reader thread's blocking readline
+        if self.READER is not None:
+            self.READER.stop()
+        if self.PRINTER is not None:
+            self.PRINTER.close()
+
+    def send_printer_cmd(self, cmd):
+        # queues the command, returns a future resolved with its response lines on "ok"
+        if self.DEBUG_STRINGS:
+            print("Sending: " + cmd)
+        return self.COMMANDS.send(cmd)
+
+    def wait_for_cmd(self, cmd):
+        return self.COMMANDS.wait(self.send_printer_cmd(cmd))
+
+    def send_sync_cmd(self, cmd, msg):
+        # the command queue releases us as soon as this command's own "ok" arrives
+        print(msg, end="")
+        self.wait_for_cmd(cmd)
+        print("OK")
+
+    def send_sync_move_cmd(self, move_command, msg=None, ack=True):
+        if msg is not None:
+            print(msg, end="")
+        # issue the move command, M400 is only acknowledged once all moves have finished
+        self.send_printer_cmd(move_command)
+        self.wait_for_cmd("M400")
+        if ack:
+            print("OK")
+
+    def get_firmware_version(self):
+        print("Checking printer firmware version: ", end="")
+        # the firmware report arrives before the "ok"
+        self.read_firmware_report(self.wait_for_cmd("M115"))
+        if self.MACHINE_FIRMWARE_NAME != "":
+            print(self.MACHINE_FIRMWARE_NAME + " " + self.MACHINE_FIRMWARE_VERSION)
+
+    def read_firmware_report(self, responses):
+        for prt_response in responses:
+            if not prt_response.startswith("FIRMWARE_NAME"):
+                continue
+            tokens = prt_response.split()
+            self.MACHINE_FIRMWARE_NAME = tokens[0].split(":")[1]
+            self.MACHINE_FIRMWARE_VERSION = tokens[1]
+            uuid = re.search(r"UUID:(\S+)", prt_response)
+            if uuid is not None:
+                self.MACHINE_UUID = uuid.group(1)